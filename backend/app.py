@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, redirect, url_for, render_template, make_response, send_file
+from flask import Flask, request, jsonify, redirect, url_for, render_template, make_response, send_file, Response, stream_with_context
 from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
@@ -7,16 +7,20 @@ from werkzeug.utils import secure_filename
 from functools import wraps
 from datetime import datetime, timedelta
 from markdown import markdown
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import uuid
 import pdfkit
 import smtplib
 import random
+import json
+import time
 from notes_route import notes_route
 from quiz_route import quiz_route
 from transcript_proc import video_processing_bp
+import job_queue
+import generation_jobs
+import llm
 
 
 app = Flask(__name__)
@@ -69,18 +73,11 @@ app.register_blueprint(notes_route, url_prefix='/notes')
 app.register_blueprint(quiz_route, url_prefix='/quiz')
 app.register_blueprint(video_processing_bp)
 
-# Configure Gemini with the API key from environment
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-app.config['GEMINI_API_KEY'] = GEMINI_API_KEY
-genai.configure(api_key=GEMINI_API_KEY)
-
-# Define the model
-try:
-    model = genai.GenerativeModel("gemini-1.5-flash")  # Specify the Gemini model to use
-    print("Gemini model initialized successfully!")
-except Exception as e:
-    print(f"Error initializing Gemini model: {e}")
-    model = None
+# Start the transcription workers and resume any jobs interrupted by a restart
+job_queue.start_workers()
+
+# Gemini is configured once in llm; every route goes through its shared client
+app.config['GEMINI_API_KEY'] = llm.GEMINI_API_KEY
 # ---------------------- AUTHENTICATION ROUTES ---------------------- #
 
 @app.route('/register', methods=['POST'])
@@ -768,18 +765,10 @@ def delete_lecture(lecture_id):
 
 # --- LECTURE PLANS API --- #
 
-@app.route('/generatelectureplan/<lecture_id>', methods=['GET'])
-@user_required
-def generate_lecture_plan(lecture_id):
-    current_user = get_jwt_identity()
-    user_id = current_user.get('userId') or current_user.get('email')
-    
-    # Check if the lecture exists and belongs to user
-    lecture = lectures_col.find_one({"id": lecture_id, "userId": user_id})
-    if not lecture:
-        return jsonify({"error": "Lecture not found or access denied"}), 404
-    
-    # Fetch all incomplete topics for this user
+def find_incomplete_topics(user_id):
+    """
+    Returns the user's incomplete topics with the names of their chapters.
+    """
     pipeline = [
         {
             "$match": {
@@ -811,8 +800,13 @@ def generate_lecture_plan(lecture_id):
         }
     ]
     
-    incomplete_topics = list(topics_col.aggregate(pipeline))
-    
+    return list(topics_col.aggregate(pipeline))
+
+
+def write_lecture_plan(lecture_id, user_id, username, incomplete_topics, report=None):
+    """
+    Generates a lecture plan for the given topics with Gemini and writes it to the user's plan folder.
+    """
     # Extract topic names for the Gemini prompt
     topic_names = [f"{topic['name']} (from chapter: {topic['chapter_name']})" for topic in incomplete_topics]
     
@@ -829,52 +823,62 @@ def generate_lecture_plan(lecture_id):
     5.Exercises & Homework: Recommended assignments, in-class activities, or problem sets.
     6.Additional Resources: Suggested readings, videos, or online courses for further learning.
     Format the response in Markdown to ensure clarity and easy sharing."""
-
-
     
-    try:
-        # Initialize Gemini API client
-        import google.generativeai as genai
-        
-        # Configure the API key
-        genai.configure(api_key=app.config['GEMINI_API_KEY'])
-        
-        # Generate content with Gemini
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        
-        # Extract the generated content
-        generated_content = response.text
-        
-        # Create the basic lecture plan headers and add the generated content
-        md_content = f"# Lecture Plan for Lecture {lecture_id}\n\n"
-        md_content += f"## Created by: {current_user.get('username')}\n\n"
-        md_content += "## Topics to be covered:\n\n"
-        
-        # Add topics list from database
-        for topic in incomplete_topics:
-            md_content += f"- **{topic['name']}** (Chapter: {topic['chapter_name']})\n"
-        
-        md_content += "\n## Generated Lecture Plan:\n\n"
-        md_content += generated_content
-        
-        # Ensure the lecture plans folder exists
-        lecture_plans_folder = f"lecture_plans/{user_id}"
-        if not os.path.exists(lecture_plans_folder):
-            os.makedirs(lecture_plans_folder)
+    # Generate content with Gemini
+    if report:
+        report("generating", 20)
+    response = llm.generate(prompt)
+    
+    # Extract the generated content
+    generated_content = response.text
+    if report:
+        report("saving", 90)
+    
+    # Create the basic lecture plan headers and add the generated content
+    md_content = f"# Lecture Plan for Lecture {lecture_id}\n\n"
+    md_content += f"## Created by: {username}\n\n"
+    md_content += "## Topics to be covered:\n\n"
+    
+    # Add topics list from database
+    for topic in incomplete_topics:
+        md_content += f"- **{topic['name']}** (Chapter: {topic['chapter_name']})\n"
+    
+    md_content += "\n## Generated Lecture Plan:\n\n"
+    md_content += generated_content
+    
+    # Ensure the lecture plans folder exists
+    lecture_plans_folder = f"lecture_plans/{user_id}"
+    if not os.path.exists(lecture_plans_folder):
+        os.makedirs(lecture_plans_folder)
 
-        # File path
-        file_path = os.path.join(lecture_plans_folder, f"{lecture_id}.md")
+    # File path
+    file_path = os.path.join(lecture_plans_folder, f"{lecture_id}.md")
 
-        # Write the markdown content to the file
-        with open(file_path, "w", encoding='utf-8') as f:
-            f.write(md_content)
+    # Write the markdown content to the file
+    with open(file_path, "w", encoding='utf-8') as f:
+        f.write(md_content)
 
-        return jsonify({
-            "message": "Lecture plan generated successfully with Gemini AI",
-            "file_path": file_path
-        }), 200
-        
+    return {
+        "message": "Lecture plan generated successfully with Gemini AI",
+        "file_path": file_path
+    }
+
+@app.route('/generatelectureplan/<lecture_id>', methods=['GET'])
+@user_required
+def generate_lecture_plan(lecture_id):
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    # Check if the lecture exists and belongs to user
+    lecture = lectures_col.find_one({"id": lecture_id, "userId": user_id})
+    if not lecture:
+        return jsonify({"error": "Lecture not found or access denied"}), 404
+    
+    # Fetch all incomplete topics for this user
+    incomplete_topics = find_incomplete_topics(user_id)
+    
+    try:
+        return jsonify(write_lecture_plan(lecture_id, user_id, current_user.get('username'), incomplete_topics)), 200
     except Exception as e:
         # Handle API errors
         return jsonify({
@@ -882,6 +886,28 @@ def generate_lecture_plan(lecture_id):
             "message": "Creating basic template instead"
         }), 500
 
+@app.route('/generatelectureplan/<lecture_id>/async', methods=['POST'])
+@user_required
+def generate_lecture_plan_async(lecture_id):
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    lecture = lectures_col.find_one({"id": lecture_id, "userId": user_id})
+    if not lecture:
+        return jsonify({"error": "Lecture not found or access denied"}), 404
+    
+    incomplete_topics = find_incomplete_topics(user_id)
+    
+    try:
+        job_id = generation_jobs.submit(
+            "lecture_plan", user_id, write_lecture_plan,
+            lecture_id, user_id, current_user.get('username'), incomplete_topics
+        )
+    except generation_jobs.TooManyJobsError as e:
+        return jsonify({"error": str(e)}), 429
+    
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
 
 @app.route('/lectureplan/<lecture_id>', methods=['GET', 'PUT'])
 @user_required
@@ -1016,7 +1042,7 @@ def export_lecture_plan(lecture_id):
 @app.route('/ai/generate-content', methods=['POST'])
 @user_required
 def generate_ai_content():
-    if not model:
+    if not llm.available():
         return jsonify({"error": "AI generation is not available. GEMINI_API_KEY is not configured."}), 503
     
     data = request.json
@@ -1026,16 +1052,47 @@ def generate_ai_content():
         return jsonify({"error": "Prompt is required"}), 400
     
     try:
-        response = model.generate_content(prompt)
+        response = llm.generate(prompt)
         ai_content = response.text
         return jsonify({"content": ai_content}), 200
     except Exception as e:
         return jsonify({"error": f"AI generation failed: {str(e)}"}), 500
 
+def write_enhanced_plan(user_id, safe_lecture_id, current_plan, enhancement_type, report=None):
+    """
+    Enhances a lecture plan with Gemini and saves it next to the original as <lecture_id>_enhanced.md.
+    """
+    # Create prompts based on enhancement type
+    prompt_map = {
+        'general': f"Enhance the following lecture plan with more detailed points, better organization, and teaching tips:\n\n{current_plan}",
+        'add_examples': f"Add relevant examples and case studies to this lecture plan:\n\n{current_plan}",
+        'add_assessment': f"Add assessment questions and activities to this lecture plan:\n\n{current_plan}",
+        'simplify': f"Simplify this lecture plan to make it more concise and focused:\n\n{current_plan}"
+    }
+    
+    prompt = prompt_map.get(enhancement_type, prompt_map['general'])
+    
+    if report:
+        report("generating", 20)
+    response = llm.generate(prompt)
+    enhanced_plan = response.text
+    
+    # Write the enhanced plan to a new file
+    enhanced_file_path = os.path.join(f"lecture_plans/{user_id}", f"{safe_lecture_id}_enhanced.md")
+    with open(enhanced_file_path, "w", encoding='utf-8') as f:
+        f.write(enhanced_plan)
+    
+    return {
+        "message": "Lecture plan enhanced successfully",
+        "original_plan": current_plan,
+        "enhanced_plan": enhanced_plan,
+        "file_path": enhanced_file_path
+    }
+
 @app.route('/ai/enhance-lecture-plan/<lecture_id>', methods=['POST'])
 @user_required
 def enhance_lecture_plan(lecture_id):
-    if not app.config.get('GEMINI_API_KEY') or not model:
+    if not llm.available():
         return jsonify({"error": "AI enhancement is not available. GEMINI_API_KEY is not configured."}), 503
     
     current_user = get_jwt_identity()
@@ -1057,34 +1114,92 @@ def enhance_lecture_plan(lecture_id):
     data = request.json
     enhancement_type = data.get('enhancement_type', 'general')
     
-    # Create prompts based on enhancement type
-    prompt_map = {
-        'general': f"Enhance the following lecture plan with more detailed points, better organization, and teaching tips:\n\n{current_plan}",
-        'add_examples': f"Add relevant examples and case studies to this lecture plan:\n\n{current_plan}",
-        'add_assessment': f"Add assessment questions and activities to this lecture plan:\n\n{current_plan}",
-        'simplify': f"Simplify this lecture plan to make it more concise and focused:\n\n{current_plan}"
-    }
-    
-    prompt = prompt_map.get(enhancement_type, prompt_map['general'])
-    
     try:
-        response = model.generate_content(prompt)
-        enhanced_plan = response.text
-        
-        # Write the enhanced plan to a new file
-        enhanced_file_path = os.path.join(f"lecture_plans/{user_id}", f"{safe_lecture_id}_enhanced.md")
-        with open(enhanced_file_path, "w", encoding='utf-8') as f:
-            f.write(enhanced_plan)
-        
-        return jsonify({
-            "message": "Lecture plan enhanced successfully",
-            "original_plan": current_plan,
-            "enhanced_plan": enhanced_plan,
-            "file_path": enhanced_file_path
-        }), 200
+        return jsonify(write_enhanced_plan(user_id, safe_lecture_id, current_plan, enhancement_type)), 200
     except Exception as e:
         return jsonify({"error": f"AI enhancement failed: {str(e)}"}), 500
 
+@app.route('/ai/enhance-lecture-plan/<lecture_id>/async', methods=['POST'])
+@user_required
+def enhance_lecture_plan_async(lecture_id):
+    if not llm.available():
+        return jsonify({"error": "AI enhancement is not available. GEMINI_API_KEY is not configured."}), 503
+    
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    safe_lecture_id = secure_filename(lecture_id)
+    file_path = os.path.join(f"lecture_plans/{user_id}", f"{safe_lecture_id}.md")
+    if not os.path.exists(file_path):
+        return jsonify({"error": "Lecture plan not found"}), 404
+    
+    with open(file_path, "r", encoding='utf-8') as f:
+        current_plan = f.read()
+    
+    data = request.json or {}
+    enhancement_type = data.get('enhancement_type', 'general')
+    
+    try:
+        job_id = generation_jobs.submit(
+            "lecture_plan_enhancement", user_id, write_enhanced_plan,
+            user_id, safe_lecture_id, current_plan, enhancement_type
+        )
+    except generation_jobs.TooManyJobsError as e:
+        return jsonify({"error": str(e)}), 429
+    
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+# --- GENERATION JOB ROUTES --- #
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@user_required
+def get_generation_job(job_id):
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    job = generation_jobs.get_job(job_id, user_id)
+    if not job:
+        return jsonify({"error": "Job not found or access denied"}), 404
+    return jsonify(job), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+@user_required
+def stream_generation_job(job_id):
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    if not generation_jobs.get_job(job_id, user_id):
+        return jsonify({"error": "Job not found or access denied"}), 404
+    
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    def generate():
+        last_progress = None
+        while True:
+            job = generation_jobs.get_job(job_id, user_id)
+            if job["status"] == "completed":
+                yield event("complete", job)
+                return
+            if job["status"] == "error":
+                yield event("error", {"error": job.get("error")})
+                return
+            if (job["stage"], job["progress"]) != last_progress:
+                last_progress = (job["stage"], job["progress"])
+                yield event("progress", {"stage": job["stage"], "progress": job["progress"]})
+            time.sleep(1)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/jobs/metrics', methods=['GET'])
+@user_required
+def generation_job_metrics():
+    return jsonify(generation_jobs.pool_metrics()), 200
+
 # --- STATS AND ANALYTICS --- #
 
 @app.route('/stats/dashboard', methods=['GET'])
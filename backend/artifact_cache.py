@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+
+
+# Content-addressed cache of derived artifacts, bounded in size with LRU eviction
+CACHE_FOLDER = os.getenv("ARTIFACT_CACHE_DIR", "cache")
+CACHE_MAX_BYTES = int(float(os.getenv("ARTIFACT_CACHE_MAX_GB", 20)) * 1024 ** 3)
+HASH_BLOCK_BYTES = 1 << 20
+
+# Writes only add to a running size estimate; the cache folder is walked when the estimate goes
+# over the bound, or at most this often to pick up writes from other processes
+EVICT_RESCAN_SECONDS = 300
+
+VIDEOS_FOLDER = os.path.join(CACHE_FOLDER, "videos")
+CHUNKS_FOLDER = os.path.join(CACHE_FOLDER, "chunks")
+
+os.makedirs(VIDEOS_FOLDER, exist_ok=True)
+os.makedirs(CHUNKS_FOLDER, exist_ok=True)
+
+_evict_lock = threading.Lock()
+_estimated_bytes = None
+_last_scan = 0.0
+
+
+def save_and_hash(stream, dest_path):
+    """
+    Writes an upload stream to disk while hashing it.
+
+    Returns:
+        str: SHA-256 hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(dest_path, "wb") as out:
+        while True:
+            block = stream.read(HASH_BLOCK_BYTES)
+            if not block:
+                break
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+def file_hash(path):
+    """
+    Hashes an existing file in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def artifact_path(content_hash, name):
+    """
+    Returns the cache path of a named artifact for a video.
+    """
+    folder = os.path.join(VIDEOS_FOLDER, content_hash)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, name)
+
+
+def _touch(path):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def has_file(content_hash, name):
+    """
+    Checks for a cached file artifact, marking it as recently used.
+    """
+    path = os.path.join(VIDEOS_FOLDER, content_hash, name)
+    if os.path.exists(path):
+        _touch(path)
+        return True
+    return False
+
+
+def temp_path(content_hash, name):
+    """
+    Returns a unique temporary path to build an artifact before commit_file().
+    """
+    return artifact_path(content_hash, f".{name}.{uuid.uuid4().hex}.tmp")
+
+
+def commit_file(content_hash, name, tmp_path):
+    """
+    Atomically moves a finished artifact into place and enforces the size bound.
+    """
+    path = artifact_path(content_hash, name)
+    os.replace(tmp_path, path)
+    evict(added=_size(path))
+    return path
+
+
+def settings_name(name, *settings):
+    """
+    Names an artifact after the settings it was derived with, so changing them misses the cache
+    instead of returning results computed under the old ones.
+    """
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return f"{name}-{digest.hexdigest()[:12]}"
+
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _touch(path)
+    return data
+
+
+def _write_json(path, data):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def get_json(content_hash, name):
+    """
+    Loads a cached JSON artifact for a video, or None.
+    """
+    if not content_hash:
+        return None
+    return _read_json(os.path.join(VIDEOS_FOLDER, content_hash, f"{name}.json"))
+
+
+def put_json(content_hash, name, data):
+    """
+    Stores a JSON artifact for a video.
+    """
+    if not content_hash:
+        return
+    path = artifact_path(content_hash, f"{name}.json")
+    _write_json(path, data)
+    evict(added=_size(path))
+
+
+def chunk_key(samples, model_name):
+    """
+    Keys a transcription chunk by its audio content, so unchanged audio is reused across uploads.
+    """
+    digest = hashlib.sha256(model_name.encode())
+    digest.update(samples.tobytes())
+    return digest.hexdigest()
+
+
+def get_chunk_segments(key):
+    """
+    Loads cached chunk-relative Whisper segments, or None.
+    """
+    return _read_json(os.path.join(CHUNKS_FOLDER, f"{key}.json"))
+
+
+def put_chunk_segments(key, segments):
+    """
+    Stores chunk-relative Whisper segments.
+    """
+    path = os.path.join(CHUNKS_FOLDER, f"{key}.json")
+    _write_json(path, [
+        {"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+        for segment in segments
+    ])
+    evict(added=_size(path))
+
+
+def evict(max_bytes=CACHE_MAX_BYTES, added=0):
+    """
+    Deletes least recently used artifacts until the cache fits in max_bytes.
+
+    Args:
+        max_bytes (int): Size bound of the cache
+        added (int): Bytes just written; while the running estimate stays under the bound and
+            was rescanned recently, nothing is walked
+    """
+    global _estimated_bytes, _last_scan
+    with _evict_lock:
+        if _estimated_bytes is not None and time.time() - _last_scan < EVICT_RESCAN_SECONDS:
+            _estimated_bytes += added
+            if _estimated_bytes <= max_bytes:
+                return
+
+        _last_scan = time.time()
+        entries = []
+        total = 0
+        for root, _, files in os.walk(CACHE_FOLDER):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        _estimated_bytes = total
+        if total <= max_bytes:
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= max_bytes:
+                break
+        _estimated_bytes = total
+
+        # Drop video folders emptied by eviction
+        for name in os.listdir(VIDEOS_FOLDER):
+            folder = os.path.join(VIDEOS_FOLDER, name)
+            if os.path.isdir(folder) and not os.listdir(folder):
+                shutil.rmtree(folder, ignore_errors=True)
@@ -0,0 +1,210 @@
+import os
+import tempfile
+import subprocess
+import numpy as np
+
+
+# Whisper consumes 16 kHz mono audio
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2  # signed 16-bit PCM
+READ_BLOCK_BYTES = 1 << 20
+
+# Silence-aware chunking settings (seconds unless noted)
+CHUNK_TARGET_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", 120))
+CHUNK_SEARCH_SECONDS = 20       # how far around the target a cut point may move
+CHUNK_OVERLAP_SECONDS = 1.0     # audio repeated on both sides of a cut for context
+DROP_SILENCE_SECONDS = 5.0      # silent stretches at least this long are not transcribed
+ENERGY_FRAME_SECONDS = 0.03
+SILENCE_FLOOR = 0.003           # RMS below this is always silence
+
+
+def ffmpeg_binary():
+    """
+    Returns the ffmpeg executable, preferring the one bundled with imageio-ffmpeg.
+    """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def extract_pcm(video_path, pcm_path):
+    """
+    Streams 16 kHz mono PCM out of ffmpeg into a raw file, without any intermediate encode.
+
+    Returns:
+        int: Number of samples written
+    """
+    print(f"Extracting PCM audio from {video_path}...")
+    command = [
+        ffmpeg_binary(), "-nostdin", "-loglevel", "error",
+        "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-acodec", "pcm_s16le", "-",
+    ]
+    written = 0
+    # stderr goes to a file: a full stderr pipe would block ffmpeg while we wait on stdout
+    with tempfile.TemporaryFile() as error_log:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=error_log) as process, \
+                open(pcm_path, "wb") as out:
+            while True:
+                block = process.stdout.read(READ_BLOCK_BYTES)
+                if not block:
+                    break
+                out.write(block)
+                written += len(block)
+            process.wait()
+        if process.returncode != 0:
+            error_log.seek(0)
+            stderr = error_log.read()
+            raise Exception(f"ffmpeg failed to extract audio: {stderr.decode(errors='ignore').strip()}")
+
+    samples = written // BYTES_PER_SAMPLE
+    print(f"Extracted {samples / SAMPLE_RATE:.1f}s of audio to {pcm_path}")
+    return samples
+
+
+def open_pcm(pcm_path):
+    """
+    Memory-maps a raw PCM file as int16 samples.
+    """
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+
+def load_pcm_slice(pcm_path, start_sample, end_sample):
+    """
+    Reads part of a PCM file as the float32 array Whisper expects.
+    """
+    samples = open_pcm(pcm_path)[start_sample:end_sample]
+    return samples.astype(np.float32) / 32768.0
+
+
+def frame_energy(samples, frame_length):
+    """
+    Computes the RMS energy of consecutive frames, reading the memmap in blocks.
+    """
+    frames = len(samples) // frame_length
+    energy = np.empty(frames, dtype=np.float32)
+    block_frames = max(1, (SAMPLE_RATE * 60) // frame_length)
+    for first in range(0, frames, block_frames):
+        last = min(frames, first + block_frames)
+        block = samples[first * frame_length:last * frame_length].astype(np.float32) / 32768.0
+        energy[first:last] = np.sqrt(np.mean(block.reshape(-1, frame_length) ** 2, axis=1))
+    return energy
+
+
+def _voiced_regions(silent, min_silent_frames):
+    """
+    Returns (start, end) frame ranges left after removing long silent runs.
+    """
+    regions = []
+    region_start = 0
+    run_start = None
+    for index, is_silent in enumerate(np.append(silent, True)):
+        if is_silent and run_start is None:
+            run_start = index
+        elif not is_silent and run_start is not None:
+            if index - run_start >= min_silent_frames:
+                if run_start > region_start:
+                    regions.append((region_start, run_start))
+                region_start = index
+            run_start = None
+    end = len(silent)
+    if run_start is not None and end - run_start >= min_silent_frames:
+        end = run_start
+    if end > region_start:
+        regions.append((region_start, end))
+    return regions
+
+
+def segment_pcm(pcm_path, target_seconds=CHUNK_TARGET_SECONDS, search_seconds=CHUNK_SEARCH_SECONDS,
+                overlap_seconds=CHUNK_OVERLAP_SECONDS, drop_silence_seconds=DROP_SILENCE_SECONDS):
+    """
+    Splits a PCM file into chunks cut in silence near a target length.
+
+    Long silent stretches are dropped entirely. Each chunk carries its real
+    offset plus the keep_from/keep_until window used to de-duplicate the
+    overlap when stitching segments back together.
+
+    Returns:
+        list: dicts with index, start_sample, end_sample, offset, keep_from and keep_until
+    """
+    samples = open_pcm(pcm_path)
+    frame_length = int(ENERGY_FRAME_SECONDS * SAMPLE_RATE)
+    energy = frame_energy(samples, frame_length)
+    if len(energy) == 0:
+        return []
+
+    threshold = max(SILENCE_FLOOR, float(np.percentile(energy, 10)) * 3)
+    silent = energy < threshold
+
+    # Smoothed energy used to find the quietest cut point near each target
+    smooth_frames = max(1, int(0.5 / ENERGY_FRAME_SECONDS))
+    smoothed = np.convolve(energy, np.ones(smooth_frames) / smooth_frames, mode="same")
+
+    frames_per_second = 1 / ENERGY_FRAME_SECONDS
+    target = int(target_seconds * frames_per_second)
+    search = int(search_seconds * frames_per_second)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+
+    chunks = []
+    for region_start, region_end in _voiced_regions(silent, int(drop_silence_seconds * frames_per_second)):
+        cursor = region_start
+        while cursor < region_end:
+            if region_end - cursor <= target + search:
+                cut = region_end
+            else:
+                low = cursor + target - search
+                high = cursor + target + search
+                cut = low + int(np.argmin(smoothed[low:high]))
+
+            keep_from = cursor * frame_length
+            keep_until = cut * frame_length
+            start_sample = max(region_start * frame_length, keep_from - overlap)
+            end_sample = min(region_end * frame_length, keep_until + overlap)
+            chunks.append({
+                "index": len(chunks),
+                "start_sample": start_sample,
+                "end_sample": end_sample,
+                "offset": start_sample / SAMPLE_RATE,
+                "keep_from": keep_from / SAMPLE_RATE,
+                "keep_until": keep_until / SAMPLE_RATE,
+            })
+            cursor = cut
+
+    kept = sum(chunk["keep_until"] - chunk["keep_from"] for chunk in chunks)
+    print(f"Audio split into {len(chunks)} chunks covering {kept:.1f}s of "
+          f"{len(samples) / SAMPLE_RATE:.1f}s (silence skipped).")
+    return chunks
+
+
+def keep_segments(chunk, segments):
+    """
+    Drops segments whose midpoint falls in the chunk's overlap with a neighbour.
+    """
+    kept = []
+    for segment in segments:
+        midpoint = (segment["start"] + segment["end"]) / 2
+        if chunk.get("keep_from", 0) <= midpoint < chunk.get("keep_until", float("inf")):
+            kept.append(segment)
+    return kept
+
+
+def stitch_segments(chunk_segments):
+    """
+    Merges per-chunk segments into one ordered transcript, dropping overlap duplicates.
+
+    Args:
+        chunk_segments (list): (chunk, segments) pairs with lecture-relative timestamps
+    """
+    stitched = []
+    for chunk, segments in sorted(chunk_segments, key=lambda item: item[0]["keep_from"]):
+        for segment in keep_segments(chunk, segments):
+            if stitched and stitched[-1]["text"].strip() == segment["text"].strip() \
+                    and segment["start"] - stitched[-1]["start"] < CHUNK_OVERLAP_SECONDS * 2:
+                continue
+            stitched.append(segment)
+    return stitched
@@ -0,0 +1,211 @@
+import os
+import shutil
+import subprocess
+from functools import lru_cache
+import cv2
+import numpy as np
+import artifact_cache
+
+
+# One downscaled thumbnail is kept every FRAME_INDEX_INTERVAL_SECONDS
+FRAME_INDEX_INTERVAL_SECONDS = float(os.getenv("FRAME_INDEX_INTERVAL_SECONDS", 2))
+FRAME_INDEX_THUMB_WIDTH = int(os.getenv("FRAME_INDEX_THUMB_WIDTH", 160))
+
+FRAME_INDEX_JPEG_QUALITY = 80
+
+# The index lives with the upload's other cached artifacts, so ARTIFACT_CACHE_MAX_GB bounds it;
+# its metadata is written last and marks the index as complete
+META_NAME = "frame_index"
+META_FILE = f"{META_NAME}.json"
+THUMBNAILS_FILE = "frame_thumbnails.bin"
+
+
+def probe_keyframes(video_path, fps):
+    """
+    Lists the video's keyframes from its container, without decoding.
+
+    Returns:
+        ndarray: (K, 2) int64 rows of (frame_index, byte_offset); empty if ffprobe is unavailable
+    """
+    ffprobe = shutil.which("ffprobe")
+    if not ffprobe or not fps:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    command = [
+        ffprobe, "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,pos,flags", "-of", "csv=p=0", video_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"ffprobe failed to list keyframes: {result.stderr.strip()}")
+        return np.zeros((0, 2), dtype=np.int64)
+
+    rows = []
+    for line in result.stdout.splitlines():
+        fields = line.split(",")
+        if len(fields) < 3 or not fields[2].startswith("K"):
+            continue
+        try:
+            rows.append((round(float(fields[0]) * fps), int(fields[1])))
+        except ValueError:
+            continue
+    rows.sort()
+    return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+
+def build_index(video_path, content_hash, interval=FRAME_INDEX_INTERVAL_SECONDS, thumb_width=FRAME_INDEX_THUMB_WIDTH):
+    """
+    Decodes a video once and caches its frame index: the keyframe table, and JPEG thumbnails at
+    a fixed interval stored back to back in one file. Does nothing if the index already exists.
+
+    Args:
+        video_path (str): Path to the uploaded video
+        content_hash (str): Hash of the upload, keying its artifact cache folder
+        interval (float): Seconds between thumbnails
+        thumb_width (int): Thumbnail width in pixels; the height keeps the aspect ratio
+
+    Returns:
+        FrameIndex: The index
+    """
+    index = open_index(content_hash)
+    if index is not None:
+        return index
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Failed to open video file: {video_path}")
+
+    tmp_path = artifact_cache.temp_path(content_hash, THUMBNAILS_FILE)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        step = max(1, round(fps * interval))
+        thumb_height = max(2, round(height * thumb_width / width / 2) * 2) if width else thumb_width
+        encode_params = [cv2.IMWRITE_JPEG_QUALITY, FRAME_INDEX_JPEG_QUALITY]
+
+        frames = []
+        offsets = [0]
+        position = 0
+        with open(tmp_path, "wb") as out:
+            while cap.grab():
+                if position % step == 0:
+                    ret, frame = cap.retrieve()
+                    if ret:
+                        thumbnail = cv2.resize(frame, (thumb_width, thumb_height), interpolation=cv2.INTER_AREA)
+                        ok, encoded = cv2.imencode(".jpg", thumbnail, encode_params)
+                        if ok:
+                            out.write(encoded.tobytes())
+                            frames.append(position)
+                            offsets.append(offsets[-1] + len(encoded))
+                position += 1
+        keyframes = probe_keyframes(video_path, fps)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        cap.release()
+
+    # A concurrent job indexing the same upload produces the same files, so either may win
+    artifact_cache.commit_file(content_hash, THUMBNAILS_FILE, tmp_path)
+    artifact_cache.put_json(content_hash, META_NAME, {
+        "fps": fps,
+        "total_frames": position,
+        "width": width,
+        "height": height,
+        "interval": interval,
+        "count": len(frames),
+        "thumb_width": thumb_width,
+        "thumb_height": thumb_height,
+        "frames": frames,
+        "offsets": offsets,
+        "keyframes": keyframes.tolist(),
+    })
+    return open_index(content_hash)
+
+
+class FrameIndex:
+    """
+    Read-only view of a frame index. The tables are small and kept in memory; thumbnails are
+    read from disk one at a time, already JPEG-encoded, so opening it costs no decoding.
+    """
+
+    def __init__(self, content_hash):
+        self.meta = artifact_cache.get_json(content_hash, META_NAME)
+        if self.meta is None:
+            raise FileNotFoundError(f"Frame index of {content_hash} is missing")
+        self.thumbnails_path = artifact_cache.artifact_path(content_hash, THUMBNAILS_FILE)
+        self.fps = self.meta["fps"]
+        self.total_frames = self.meta["total_frames"]
+        self.frames = np.array(self.meta.pop("frames"), dtype=np.int64)
+        self.offsets = np.array(self.meta.pop("offsets"), dtype=np.int64)
+        self.keyframes = np.array(self.meta.pop("keyframes"), dtype=np.int64).reshape(-1, 2)
+
+    def thumbnail_at(self, seconds):
+        """
+        Returns the JPEG bytes of the thumbnail nearest to a timestamp, or None for an empty or
+        evicted index.
+        """
+        if not len(self.frames):
+            return None
+        position = int(np.searchsorted(self.frames, seconds * self.fps))
+        if position == len(self.frames) or (position > 0 and
+                seconds * self.fps - self.frames[position - 1] < self.frames[position] - seconds * self.fps):
+            position -= 1
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        try:
+            with open(self.thumbnails_path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+        except OSError:
+            return None
+
+    def keyframe_before(self, frame_index):
+        """
+        Returns the last keyframe at or before frame_index, or None if unknown.
+        """
+        if not len(self.keyframes):
+            return None
+        position = int(np.searchsorted(self.keyframes[:, 0], frame_index, side="right")) - 1
+        return int(self.keyframes[position, 0]) if position >= 0 else None
+
+    def summary(self):
+        """
+        Describes the index for clients, e.g. to lay out a scrubbing strip.
+        """
+        return {
+            "fps": self.fps,
+            "duration": self.total_frames / self.fps if self.fps else 0,
+            "interval": self.meta["interval"],
+            "count": self.meta["count"],
+            "thumb_width": self.meta["thumb_width"],
+            "thumb_height": self.meta["thumb_height"],
+            "keyframes": len(self.keyframes),
+        }
+
+
+@lru_cache(maxsize=32)
+def _open(content_hash, version):
+    return FrameIndex(content_hash)
+
+
+def open_index(content_hash):
+    """
+    Opens a frame index, or returns None if it has not been built or was partly evicted.
+    """
+    if not content_hash:
+        return None
+    # has_file() also marks both files as recently used, so they are evicted together
+    if not (artifact_cache.has_file(content_hash, META_FILE) and artifact_cache.has_file(content_hash, THUMBNAILS_FILE)):
+        return None
+    try:
+        # A rebuilt index is a new file; touching an old one does not change its inode
+        version = os.stat(artifact_cache.artifact_path(content_hash, META_FILE)).st_ino
+    except OSError:
+        return None
+    try:
+        return _open(content_hash, version)
+    except FileNotFoundError:
+        # Evicted since the check above
+        return None
@@ -0,0 +1,223 @@
+import os
+import statistics
+import cv2
+
+
+# Frames per second first sampled inside each question window
+SAMPLE_FPS = float(os.getenv("HAND_RAISE_SAMPLE_FPS", 1))
+
+# Where the count changes between two samples, bisect down to this sampling rate
+MAX_SAMPLE_FPS = float(os.getenv("HAND_RAISE_MAX_FPS", 4))
+
+# Stop scanning a window once this many consecutive samples return the same non-zero count
+STABLE_SAMPLES = int(os.getenv("HAND_RAISE_STABLE_SAMPLES", 3))
+
+# How a window's samples become one count: "peak" or "median"
+AGGREGATE = os.getenv("HAND_RAISE_AGGREGATE", "peak").lower()
+
+# Gaps longer than this many seconds are skipped with one seek instead of grabbing through them
+SEEK_GAP_SECONDS = 10
+
+
+def video_info(video_path):
+    """
+    Returns (fps, total_frames) of a video.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise Exception(f"Failed to open video file: {video_path}")
+    try:
+        return cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+class FrameReader:
+    """
+    Keeps one capture open and decodes requested frames, grabbing forward where it can and
+    seeking only across long gaps or back to a frame already passed.
+
+    Args:
+        video_path (str): Path to the video file
+        index (FrameIndex): Frame index of the video; seeks then land on its keyframes
+    """
+
+    def __init__(self, video_path, index=None):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise Exception(f"Failed to open video file: {video_path}")
+        self.index = index
+        self.seek_gap = int(self.cap.get(cv2.CAP_PROP_FPS) * SEEK_GAP_SECONDS)
+        self.position = 0  # index of the next frame grab() will return
+
+    def _seek(self, frame_index):
+        # Seeking to the keyframe before the target and grabbing forward is frame-accurate;
+        # if that keyframe is between us and the target, grabbing forward costs the same as seeking
+        keyframe = self.index.keyframe_before(frame_index) if self.index is not None else None
+        if keyframe is None:
+            target = frame_index
+        elif self.position <= keyframe or frame_index < self.position:
+            target = keyframe
+        else:
+            return
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        self.position = target
+
+    def read(self, frame_index):
+        """
+        Returns the frame at frame_index, or None if the video ends first.
+        """
+        if frame_index < self.position or frame_index - self.position > self.seek_gap:
+            self._seek(frame_index)
+        while self.position < frame_index:
+            if not self.cap.grab():
+                return None
+            self.position += 1
+        if not self.cap.grab():
+            return None
+        self.position += 1
+        ret, frame = self.cap.retrieve()
+        return frame if ret else None
+
+    def close(self):
+        self.cap.release()
+
+
+class AdaptiveWindow:
+    """
+    Tracks the samples of one answer window.
+
+    The window is first scanned at a coarse step; scanning stops once stable_samples coarse
+    samples in a row agree on a non-zero count (hands are up and no longer changing). Between
+    neighbouring coarse samples that disagree, frames are then sampled every min_step.
+    """
+
+    def __init__(self, key, start_frame, end_frame, step, min_step, stable_samples=STABLE_SAMPLES):
+        self.key = key
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.step = max(1, step)
+        self.min_step = max(1, min_step)
+        self.stable_samples = stable_samples
+        self.samples = {}
+        self.last_count = None
+        self.stable = 0
+        self.stopped = False
+
+    def coarse_frames(self):
+        return list(range(self.start_frame, self.end_frame + 1, self.step))
+
+    def record_coarse(self, frame_index, count):
+        """
+        Takes the count of a coarse sample; samples arrive in frame order.
+        """
+        self.samples[frame_index] = count
+        if self.last_count is not None and count == self.last_count and count > 0:
+            self.stable += 1
+        else:
+            self.stable = 0
+        self.last_count = count
+        if self.stable + 1 >= self.stable_samples:
+            self.stopped = True
+
+    def refine_frames(self):
+        """
+        Returns the frames to sample between coarse samples whose counts differ.
+        """
+        frames = []
+        sampled = sorted(self.samples)
+        for low, high in zip(sampled, sampled[1:]):
+            if self.samples[low] != self.samples[high]:
+                frames.extend(range(low + self.min_step, high, self.min_step))
+        return frames
+
+    def count(self, aggregate=AGGREGATE):
+        """
+        Reduces the window's samples to one count of raised hands.
+        """
+        if not self.samples:
+            return 0
+        values = list(self.samples.values())
+        if aggregate == "median":
+            return statistics.median_low(values)
+        return max(values)
+
+
+def count_windows(video_path, windows, count_frames, sample_fps=SAMPLE_FPS, max_sample_fps=MAX_SAMPLE_FPS,
+                  aggregate=AGGREGATE, index=None):
+    """
+    Counts raised hands per answer window with adaptive sampling.
+
+    The coarse samples of all windows are decoded in one forward pass; a window's remaining
+    coarse frames are skipped as soon as the results received so far show its count is stable.
+    For that, detection may only run stable_samples frames ahead of the results during this
+    pass. A second forward pass decodes the finer samples around changes with full batching.
+    Both passes share one capture.
+
+    Args:
+        video_path (str): Path to the video file
+        windows (list): (key, start_time, end_time) tuples, in seconds
+        count_frames (callable): Takes (frame_index, frame, keys) tuples in ascending order, the
+            sampling step in frames and a lookahead (frames sent before the first result is
+            yielded, None for no limit), and yields (frame_index, keys, count)
+        sample_fps (float): Initial sampling rate inside each window
+        max_sample_fps (float): Sampling rate around count changes
+        aggregate (str): "peak" or "median"
+        index (FrameIndex): Frame index built at upload, used for video properties and seeking
+
+    Returns:
+        tuple: (dict of key -> count, number of frames sampled)
+    """
+    if index is not None:
+        fps, total_frames = index.fps, index.total_frames
+    else:
+        fps, total_frames = video_info(video_path)
+    states = {}
+    for key, start_time, end_time in windows:
+        start_frame = max(0, int(fps * start_time))
+        end_frame = min(total_frames - 1, int(fps * end_time))
+        states[key] = AdaptiveWindow(
+            key, start_frame, end_frame,
+            step=int(fps / sample_fps) if sample_fps > 0 else 1,
+            min_step=int(fps / max_sample_fps) if max_sample_fps > 0 else 1,
+        )
+
+    reader = FrameReader(video_path, index)
+
+    def decode(plan):
+        for frame_index in sorted(plan):
+            keys = [key for key in plan[frame_index] if not states[key].stopped]
+            if not keys:
+                continue
+            frame = reader.read(frame_index)
+            if frame is None:
+                return
+            yield frame_index, frame, keys
+
+    sampled = 0
+    try:
+        coarse = {}
+        for state in states.values():
+            for frame_index in state.coarse_frames():
+                coarse.setdefault(frame_index, []).append(state.key)
+        step = next(iter(states.values())).step if states else 1
+        lookahead = max(1, STABLE_SAMPLES)
+        for frame_index, keys, count in count_frames(decode(coarse), step, lookahead):
+            sampled += 1
+            for key in keys:
+                states[key].record_coarse(frame_index, count)
+
+        fine = {}
+        for state in states.values():
+            state.stopped = False
+            for frame_index in state.refine_frames():
+                fine.setdefault(frame_index, []).append(state.key)
+        min_step = next(iter(states.values())).min_step if states else 1
+        for frame_index, keys, count in count_frames(decode(fine), min_step, None):
+            sampled += 1
+            for key in keys:
+                states[key].samples[frame_index] = count
+    finally:
+        reader.close()
+
+    return {key: state.count(aggregate) for key, state in states.items()}, sampled
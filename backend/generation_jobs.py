@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from pymongo import MongoClient, ASCENDING
+
+load_dotenv()
+
+# Generation jobs run on threads of the web process: LLM work is I/O bound, and a request only
+# has to enqueue and return. Job state lives in Mongo so any server process can report it.
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", 8))
+GENERATION_PER_USER = int(os.getenv("GENERATION_PER_USER", 2))
+GENERATION_MAX_PENDING_PER_USER = int(os.getenv("GENERATION_MAX_PENDING_PER_USER", 10))
+# Identical generations share one result while in flight and for this long after finishing
+GENERATION_COALESCE_SECONDS = int(os.getenv("GENERATION_COALESCE_SECONDS", 10))
+GENERATION_HEARTBEAT_SECONDS = 15
+GENERATION_STALE_SECONDS = 90
+
+mongo_uri = os.getenv("MONGO_URI")
+mongo_client = MongoClient(mongo_uri)
+db = mongo_client.get_default_database()
+generation_jobs_collection = db.generation_jobs
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix="generation")
+_pending = deque()
+_running = {}
+_lock = threading.Lock()
+_heartbeat_thread = None
+
+
+class TooManyJobsError(Exception):
+    """
+    Raised when a user already has the maximum number of generation jobs waiting.
+    """
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time; concurrent callers with the same key wait for it and
+    share its result, as do callers arriving within `window` seconds after it finished.
+    Failures are not shared beyond the callers already waiting.
+    """
+
+    def __init__(self, window=GENERATION_COALESCE_SECONDS):
+        self.window = window
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def _prune(self, now):
+        expired = [key for key, call in self._calls.items()
+                   if call["finished"] is not None and now - call["finished"] > self.window]
+        for key in expired:
+            del self._calls[key]
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            self._prune(time.time())
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None, "finished": None}
+                self._calls[key] = call
+            else:
+                self.stats["coalesced"] += 1
+
+        if leader:
+            try:
+                call["result"] = fn(*args)
+            except Exception as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    call["finished"] = time.time()
+                    if call["error"] is not None:
+                        del self._calls[key]
+                call["done"].set()
+        else:
+            call["done"].wait()
+
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, in_flight=sum(1 for call in self._calls.values() if call["finished"] is None))
+
+
+flights = SingleFlight()
+
+
+def request_key(kind, user_id, *parts):
+    """
+    Identifies a generation request by its type, owner and inputs.
+    """
+    payload = json.dumps([kind, user_id, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def coalesce(key, fn, *args):
+    """
+    Runs fn(*args), sharing the result with identical requests in flight in this process.
+    """
+    return flights.do(key, fn, *args)
+
+
+def _heartbeat():
+    while True:
+        time.sleep(GENERATION_HEARTBEAT_SECONDS)
+        try:
+            generation_jobs_collection.update_many(
+                {"owner": OWNER, "status": {"$in": ["queued", "running"]}},
+                {"$set": {"heartbeat": time.time()}}
+            )
+        except Exception as e:
+            print(f"[generation jobs] heartbeat failed: {str(e)}")
+
+
+def _ensure_heartbeat():
+    global _heartbeat_thread
+    with _lock:
+        if _heartbeat_thread is None:
+            generation_jobs_collection.create_index("job_id", unique=True)
+            generation_jobs_collection.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+            generation_jobs_collection.create_index([("key", ASCENDING), ("status", ASCENDING)])
+            _heartbeat_thread = threading.Thread(target=_heartbeat, name="generation-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def _update(job_id, **fields):
+    generation_jobs_collection.update_one({"job_id": job_id}, {"$set": fields})
+
+
+def _dispatch():
+    """
+    Starts pending jobs while the pool has room, skipping users already at their cap.
+    """
+    with _lock:
+        started = []
+        for job in list(_pending):
+            if sum(_running.values()) >= GENERATION_WORKERS:
+                break
+            if _running.get(job["user_id"], 0) >= GENERATION_PER_USER:
+                continue
+            _pending.remove(job)
+            _running[job["user_id"]] = _running.get(job["user_id"], 0) + 1
+            started.append(job)
+    for job in started:
+        _executor.submit(_run, job)
+
+
+def _run(job):
+    job_id = job["job_id"]
+
+    def report(stage, progress):
+        _update(job_id, stage=stage, progress=progress, heartbeat=time.time())
+
+    _update(job_id, status="running", stage="running", started_at=time.time(), heartbeat=time.time())
+    try:
+        result = job["fn"](*job["args"], report=report)
+        _update(job_id, status="completed", stage="completed", progress=100, result=result, finished_at=time.time())
+    except Exception as e:
+        print(f"[generation jobs] {job['kind']} job {job_id} failed: {str(e)}")
+        _update(job_id, status="error", stage="error", error=str(e), finished_at=time.time())
+    finally:
+        with _lock:
+            _running[job["user_id"]] -= 1
+            if not _running[job["user_id"]]:
+                del _running[job["user_id"]]
+        _dispatch()
+
+
+def submit(kind, user_id, fn, *args, key=None):
+    """
+    Queues fn(*args, report=...) to run in the background and returns the job ID.
+
+    With a key, a request identical to a queued or running job, or to one completed within
+    GENERATION_COALESCE_SECONDS, gets that job's ID instead of a new job.
+
+    Args:
+        kind (str): Job type shown to clients, e.g. 'notes'
+        user_id (str): Owner of the job; at most GENERATION_PER_USER of their jobs run at once
+        fn (callable): Does the work and returns a JSON-serializable result; may call
+            report(stage, progress) to publish progress
+        key (str, optional): request_key() of the request, to coalesce duplicates
+
+    Raises:
+        TooManyJobsError: If the user already has GENERATION_MAX_PENDING_PER_USER jobs waiting
+    """
+    _ensure_heartbeat()
+    if key:
+        existing = generation_jobs_collection.find_one({
+            "key": key,
+            "user_id": user_id,
+            "$or": [
+                {"status": {"$in": ["queued", "running"]}},
+                {"status": "completed", "finished_at": {"$gte": time.time() - GENERATION_COALESCE_SECONDS}},
+            ],
+        }, {"job_id": 1})
+        if existing:
+            return existing["job_id"]
+
+    with _lock:
+        waiting = sum(1 for job in _pending if job["user_id"] == user_id)
+    if waiting >= GENERATION_MAX_PENDING_PER_USER:
+        raise TooManyJobsError(f"You already have {waiting} generation jobs waiting")
+
+    job_id = str(uuid.uuid4())
+    now = time.time()
+    generation_jobs_collection.insert_one({
+        "job_id": job_id,
+        "kind": kind,
+        "user_id": user_id,
+        "key": key,
+        "owner": OWNER,
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0,
+        "created_at": now,
+        "heartbeat": now,
+    })
+    with _lock:
+        _pending.append({"job_id": job_id, "kind": kind, "user_id": user_id, "fn": fn, "args": args})
+    _dispatch()
+    return job_id
+
+
+def get_job(job_id, user_id):
+    """
+    Returns a user's job without its Mongo ID, or None.
+
+    Jobs whose server process stopped sending heartbeats are reported as interrupted.
+    """
+    job = generation_jobs_collection.find_one({"job_id": job_id, "user_id": user_id}, {"_id": 0})
+    if job and job["status"] in ("queued", "running") and \
+            time.time() - job.get("heartbeat", 0) > GENERATION_STALE_SECONDS:
+        job.update(status="error", stage="error", error="Job was interrupted by a server restart")
+        _update(job_id, status="error", stage="error", error=job["error"], finished_at=time.time())
+    return job
+
+
+def pool_metrics():
+    """
+    Reports how busy this process's generation pool is.
+    """
+    with _lock:
+        return {
+            "workers": GENERATION_WORKERS,
+            "running": sum(_running.values()),
+            "pending": len(_pending),
+            "users_running": len(_running),
+            "per_user_limit": GENERATION_PER_USER,
+            "coalescing": flights.metrics(),
+        }
@@ -0,0 +1,386 @@
+import os
+import time
+import random
+import base64
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from dotenv import load_dotenv
+from inference_sdk import InferenceHTTPClient
+
+load_dotenv()
+
+HAND_RAISE_MODEL_ID = "hand-raise-v1m/20"
+
+# Detector backend: "roboflow" (hosted API) or "local" (ONNX Runtime / TorchScript on CPU)
+HAND_RAISE_BACKEND = os.getenv("HAND_RAISE_BACKEND", "roboflow").lower()
+HAND_RAISE_MODEL_PATH = os.getenv("HAND_RAISE_MODEL_PATH", "models/hand-raise.onnx")
+HAND_RAISE_BATCH_SIZE = int(os.getenv("HAND_RAISE_BATCH_SIZE", 8))
+HAND_RAISE_INPUT_SIZE = 640
+HAND_RAISE_CONFIDENCE = 0.4
+HAND_RAISE_IOU = 0.5
+
+# Inference stage tuning
+HAND_RAISE_CONCURRENCY = int(os.getenv("HAND_RAISE_CONCURRENCY", 8))
+HAND_RAISE_MAX_WIDTH = int(os.getenv("HAND_RAISE_MAX_WIDTH", 640))
+HAND_RAISE_JPEG_QUALITY = 80
+HAND_RAISE_MAX_RETRIES = 3
+HAND_RAISE_CACHE_SIZE = 100000
+
+# A sample reuses the previous sample's result if no cell of their downscaled grayscale
+# signatures differs by more than this many gray levels
+HAND_RAISE_DEDUPE_THRESHOLD = int(os.getenv("HAND_RAISE_DEDUPE_THRESHOLD", 8))
+# Signature size; at 1080p each cell covers about 30x30 pixels, so one raised hand changes a cell
+HAND_RAISE_SIGNATURE_SIZE = (64, 36)
+
+
+def frame_signature(frame, size=HAND_RAISE_SIGNATURE_SIZE):
+    """
+    Downscales a BGR frame to a small grayscale image for change detection.
+    """
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+def signatures_match(first, second, threshold=HAND_RAISE_DEDUPE_THRESHOLD):
+    """
+    Checks whether two signatures show the same scene: no cell changed by more than threshold.
+    """
+    return int(cv2.absdiff(first, second).max()) <= threshold
+
+
+def encode_frame(frame, max_width=HAND_RAISE_MAX_WIDTH, quality=HAND_RAISE_JPEG_QUALITY):
+    """
+    Downscales a BGR frame and encodes it once as a base64 JPEG.
+    """
+    height, width = frame.shape[:2]
+    if width > max_width:
+        scale = max_width / width
+        frame = cv2.resize(frame, (max_width, int(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise Exception("Failed to encode frame as JPEG")
+    return base64.b64encode(buffer.tobytes()).decode("ascii")
+
+
+class HandRaiseDetector:
+    """
+    Interface for hand-raise detection backends.
+
+    prepare() turns a BGR frame into the backend's input once, and detect_batch()
+    returns the raised-hand count for each prepared input. describe() identifies the
+    backend and model, so cached counts of another model are not reused.
+    """
+
+    batch_size = 1
+    max_workers = HAND_RAISE_CONCURRENCY
+
+    def describe(self):
+        return type(self).__name__
+
+    def prepare(self, frame):
+        raise NotImplementedError
+
+    def detect_batch(self, inputs):
+        raise NotImplementedError
+
+
+class RoboflowDetector(HandRaiseDetector):
+    """
+    Calls the Roboflow hosted model, one request per frame.
+    """
+
+    def __init__(self, model_id=HAND_RAISE_MODEL_ID):
+        self.model_id = model_id
+        self.client = InferenceHTTPClient(
+            api_url="https://detect.roboflow.com",
+            api_key=os.getenv("ROBOFLOW_KEY")
+        )
+
+    def describe(self):
+        return f"roboflow:{self.model_id}"
+
+    def prepare(self, frame):
+        return encode_frame(frame)
+
+    def detect_batch(self, inputs):
+        counts = []
+        for image in inputs:
+            result = self.client.infer(image, model_id=self.model_id)
+            counts.append(sum(1 for box in result['predictions'] if box['class_id'] == 0))
+        return counts
+
+
+class LocalDetector(HandRaiseDetector):
+    """
+    Runs an exported YOLO-style hand-raise model on the CPU, batching frames into tensors.
+
+    Args:
+        model_path (str): Path to an .onnx model (ONNX Runtime) or a TorchScript .pt file
+        batch_size (int): Number of frames per forward pass
+    """
+
+    max_workers = 1
+
+    def __init__(self, model_path=HAND_RAISE_MODEL_PATH, batch_size=HAND_RAISE_BATCH_SIZE,
+                 input_size=HAND_RAISE_INPUT_SIZE, confidence=HAND_RAISE_CONFIDENCE, iou=HAND_RAISE_IOU):
+        import torch
+        from torchvision import transforms
+
+        if not os.path.exists(model_path):
+            raise Exception(f"Hand-raise model not found: {model_path}")
+
+        self.torch = torch
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.confidence = confidence
+        self.iou = iou
+        self.transform = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.Resize((input_size, input_size)),
+            transforms.ToTensor(),
+        ])
+
+        if model_path.endswith(".onnx"):
+            import onnxruntime
+            self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+            self.input_name = self.session.get_inputs()[0].name
+            self.model = None
+        else:
+            self.session = None
+            self.model = torch.jit.load(model_path, map_location="cpu").eval()
+
+    def describe(self):
+        return f"local:{os.path.basename(self.model_path)}:{self.confidence}:{self.iou}"
+
+    def prepare(self, frame):
+        return self.transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+    def detect_batch(self, inputs):
+        batch = self.torch.stack(inputs)
+        if self.session is not None:
+            outputs = self.session.run(None, {self.input_name: batch.numpy()})[0]
+        else:
+            with self.torch.no_grad():
+                outputs = self.model(batch)
+            if isinstance(outputs, (list, tuple)):
+                outputs = outputs[0]
+            outputs = outputs.numpy()
+        return [self._count(prediction) for prediction in outputs]
+
+    def _count(self, prediction):
+        """
+        Counts class 0 boxes in one (4 + classes, anchors) YOLO output after NMS.
+        """
+        scores = prediction[4:].max(axis=0)
+        classes = prediction[4:].argmax(axis=0)
+        keep = (scores >= self.confidence) & (classes == 0)
+        if not keep.any():
+            return 0
+        cx, cy, w, h = prediction[:4, keep]
+        boxes = [[float(x - bw / 2), float(y - bh / 2), float(bw), float(bh)]
+                 for x, y, bw, bh in zip(cx, cy, w, h)]
+        indices = cv2.dnn.NMSBoxes(boxes, scores[keep].tolist(), self.confidence, self.iou)
+        return len(indices)
+
+
+class FunctionDetector(HandRaiseDetector):
+    """
+    Wraps a plain callable taking a BGR frame, e.g. a local stub in tests.
+    """
+
+    def __init__(self, fn, max_workers=1):
+        self.fn = fn
+        self.max_workers = max_workers
+
+    def describe(self):
+        return f"function:{getattr(self.fn, '__name__', 'fn')}"
+
+    def prepare(self, frame):
+        return frame
+
+    def detect_batch(self, inputs):
+        return [self.fn(frame) for frame in inputs]
+
+
+def create_detector(backend=HAND_RAISE_BACKEND):
+    """
+    Builds the detector configured for this deployment.
+    """
+    if backend == "local":
+        return LocalDetector()
+    if backend == "roboflow":
+        return RoboflowDetector()
+    raise ValueError(f"Unknown hand-raise backend: {backend}")
+
+
+class HandRaiseClient:
+    """
+    Runs hand-raise detection on a bounded thread pool with batching, retries,
+    frame deduplication and a per (video, frame index) result cache.
+
+    Args:
+        detector (HandRaiseDetector): Detection backend; defaults to the configured one
+        max_workers (int): Maximum number of concurrent detection calls
+        dedupe_threshold (int): Largest per-cell gray-level change under which consecutive samples
+            are treated as identical
+    """
+
+    def __init__(self, detector=None, max_workers=None,
+                 max_retries=HAND_RAISE_MAX_RETRIES, dedupe_threshold=HAND_RAISE_DEDUPE_THRESHOLD,
+                 cache_size=HAND_RAISE_CACHE_SIZE):
+        self.detector = detector or create_detector()
+        self.max_workers = max_workers or self.detector.max_workers
+        self.max_retries = max_retries
+        self.dedupe_threshold = dedupe_threshold
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hand-raise")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"frames": 0, "calls": 0, "deduplicated": 0, "cache_hits": 0, "retries": 0}
+
+    def settings(self):
+        """
+        Lists what the counts of this client depend on besides the frames themselves.
+        """
+        return [self.detector.describe(), self.dedupe_threshold, list(HAND_RAISE_SIGNATURE_SIZE)]
+
+    def _detect_with_retry(self, inputs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.detector.detect_batch(inputs)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(30, 2 ** attempt) + random.uniform(0, 1)
+                print(f"Hand-raise inference failed ({str(e)}), retrying in {delay:.1f}s")
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(delay)
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+        return None
+
+    def _cache_put(self, key, count):
+        with self._lock:
+            self._cache[key] = count
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def prime(self, video_key, counts):
+        """
+        Loads known per-frame counts for a video, e.g. from the artifact cache.
+        """
+        for frame_index, count in counts.items():
+            self._cache_put((video_key, frame_index), count)
+
+    def count_frames(self, video_key, frames, max_gap=None, lookahead=None):
+        """
+        Counts raised hands for a stream of frames, keeping the pool busy while decoding continues.
+
+        A frame reuses the previous result only if it is the next sample of the same windows (same
+        keys, at most max_gap frames after the previous sample) and looks like the last frame that
+        was sent for inference. Frames of different windows are never deduplicated against each other.
+
+        Args:
+            video_key (str): Identifies the video for the result cache
+            frames (iterable): (frame_index, frame, keys) tuples in ascending frame order
+            max_gap (int): Sampling step in frames; None disables deduplication
+            lookahead (int): Most frames taken from `frames` before the first of them is yielded;
+                a small value lets the caller react to results (e.g. stop sampling a window)
+                before more frames are sent, at the cost of smaller batches. Defaults to enough
+                frames to keep every worker busy
+
+        Yields:
+            tuple: (frame_index, keys, hand_raised_count) in input order
+        """
+        pending = deque()
+        limit = lookahead or self.max_workers * self.detector.batch_size * 2
+        batch, batch_slot = [], None
+        reference, previous_slot = None, None
+        previous_index, previous_keys = None, None
+
+        def flush():
+            nonlocal batch
+            batch_slot["future"] = self._executor.submit(self._detect_with_retry, batch)
+            self.stats["calls"] += 1
+            batch = []
+
+        for frame_index, frame, keys in frames:
+            self.stats["frames"] += 1
+            adjacent = max_gap is not None and previous_keys == keys and \
+                frame_index - previous_index <= max_gap
+            previous_index, previous_keys = frame_index, keys
+
+            cached = self._cache_get((video_key, frame_index))
+            if cached is not None:
+                pending.append((frame_index, keys, None, None, cached))
+                # The next sample must be compared with an inferred frame, not this one
+                previous_keys = None
+            else:
+                signature = frame_signature(frame) if max_gap is not None else None
+                if adjacent and previous_slot is not None and \
+                        signatures_match(signature, reference, self.dedupe_threshold):
+                    self.stats["deduplicated"] += 1
+                    slot, position = previous_slot
+                else:
+                    if not batch:
+                        batch_slot = {"future": None}
+                    batch.append(self.detector.prepare(frame))
+                    slot, position = batch_slot, len(batch) - 1
+                    reference, previous_slot = signature, (slot, position)
+                    if len(batch) >= self.detector.batch_size:
+                        flush()
+                pending.append((frame_index, keys, slot, position, None))
+
+            # Bound the number of frames held in memory while requests are in flight
+            while len(pending) >= limit:
+                if pending[0][2] is not None and pending[0][2]["future"] is None:
+                    flush()
+                yield self._pop(video_key, pending)
+
+        if batch:
+            flush()
+        while pending:
+            yield self._pop(video_key, pending)
+
+    def _pop(self, video_key, pending):
+        frame_index, keys, slot, position, count = pending.popleft()
+        if slot is not None:
+            count = slot["future"].result()[position]
+            self._cache_put((video_key, frame_index), count)
+        return frame_index, keys, count
+
+    def count(self, frame):
+        """
+        Counts raised hands in a single frame.
+        """
+        return self._detect_with_retry([self.detector.prepare(frame)])[0]
+
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the process-wide hand-raise client.
+    """
+    global _client
+    if _client is None:
+        _client = HandRaiseClient()
+    return _client
+
+
+def set_client(client):
+    """
+    Replaces the process-wide client, e.g. with one backed by a local stub.
+    """
+    global _client
+    _client = client
@@ -0,0 +1,276 @@
+import os
+import time
+import uuid
+import socket
+import importlib
+import threading
+import multiprocessing
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReturnDocument, ASCENDING, DESCENDING
+
+load_dotenv()
+
+# Queue sizing and worker liveness settings
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", 50))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_POLL_SECONDS = 2
+JOB_HEARTBEAT_SECONDS = 15
+JOB_STALE_SECONDS = 120
+
+PRIORITIES = {"low": 0, "normal": 5, "high": 10}
+
+# Job kinds mapped to the function that runs them inside a worker process
+JOB_HANDLERS = {
+    "process_video": "transcript_proc.process_video_and_transcript",
+}
+
+mongo_uri = os.getenv("MONGO_URI")
+mongo_client = MongoClient(mongo_uri)
+db = mongo_client.get_default_database()
+jobs_collection = db.transcription_jobs
+
+_workers = {}
+_workers_lock = threading.Lock()
+_supervisor = None
+
+
+class QueueFullError(Exception):
+    """
+    Raised when the queue is at capacity and a new job cannot be admitted.
+    """
+
+
+def queued_count():
+    """
+    Returns the number of jobs waiting for a worker.
+    """
+    return jobs_collection.count_documents({"status": "queued"})
+
+
+def has_capacity():
+    """
+    Checks whether another job can be admitted to the queue.
+    """
+    return queued_count() < JOB_QUEUE_MAX_DEPTH
+
+
+def enqueue(kind, args, lecture_id, user_id, priority="normal"):
+    """
+    Admits a job to the queue and returns its ID.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if not has_capacity():
+        raise QueueFullError(f"Processing queue is full ({JOB_QUEUE_MAX_DEPTH} jobs waiting)")
+
+    job_id = str(uuid.uuid4())
+    jobs_collection.insert_one({
+        "job_id": job_id,
+        "kind": kind,
+        "args": list(args),
+        "lecture_id": lecture_id,
+        "user_id": user_id,
+        "priority": PRIORITIES.get(priority, PRIORITIES["normal"]),
+        "status": "queued",
+        "attempts": 0,
+        "enqueued_at": time.time(),
+    })
+    ensure_workers()
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Returns a job document without its Mongo ID.
+    """
+    return jobs_collection.find_one({"job_id": job_id}, {"_id": 0})
+
+
+def _claim(worker_name):
+    """
+    Atomically takes the highest priority, oldest queued job.
+    """
+    now = time.time()
+    return jobs_collection.find_one_and_update(
+        {"status": "queued"},
+        {
+            "$set": {"status": "running", "worker": worker_name, "started_at": now, "heartbeat": now},
+            "$inc": {"attempts": 1},
+        },
+        sort=[("priority", DESCENDING), ("enqueued_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _heartbeat(job_id, stop_event):
+    while not stop_event.wait(JOB_HEARTBEAT_SECONDS):
+        jobs_collection.update_one({"job_id": job_id}, {"$set": {"heartbeat": time.time()}})
+
+
+def _resolve_handler(kind):
+    module_name, func_name = JOB_HANDLERS[kind].rsplit(".", 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def _worker_main(worker_index):
+    """
+    Worker loop: claims jobs and runs them until the parent server exits.
+    """
+    worker_name = f"{socket.gethostname()}:{os.getpid()}:{worker_index}"
+    print(f"[job queue] worker {worker_name} started")
+
+    # Import handlers up front so the heavy modules stay loaded between jobs
+    for kind in JOB_HANDLERS:
+        _resolve_handler(kind)
+
+    parent = multiprocessing.parent_process()
+    while parent is None or parent.is_alive():
+        job = _claim(worker_name)
+        if not job:
+            time.sleep(JOB_POLL_SECONDS)
+            continue
+
+        print(f"[job queue] {worker_name} running {job['kind']} {job['job_id']} "
+              f"after {job['started_at'] - job['enqueued_at']:.1f}s in queue")
+        stop_event = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(job["job_id"], stop_event), daemon=True)
+        beat.start()
+        try:
+            _resolve_handler(job["kind"])(*job["args"])
+            update = {"status": "completed"}
+        except Exception as e:
+            print(f"[job queue] job {job['job_id']} failed: {str(e)}")
+            update = {"status": "error", "error": str(e)}
+        finally:
+            stop_event.set()
+            beat.join()
+        update["finished_at"] = time.time()
+        jobs_collection.update_one({"job_id": job["job_id"]}, {"$set": update})
+
+
+def _worker_dead(worker_name):
+    """
+    Checks whether a worker on this host has exited; workers on other hosts are judged by heartbeat only.
+    """
+    host, _, rest = (worker_name or "").partition(":")
+    pid = rest.split(":", 1)[0]
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def recover_stale_jobs():
+    """
+    Requeues jobs whose worker exited or stopped sending heartbeats, e.g. after a restart or crash.
+    """
+    cutoff = time.time() - JOB_STALE_SECONDS
+    dead = [
+        job["job_id"] for job in jobs_collection.find({"status": "running"}, {"job_id": 1, "worker": 1})
+        if _worker_dead(job.get("worker"))
+    ]
+    stale = {"status": "running", "$or": [{"heartbeat": {"$lt": cutoff}}, {"job_id": {"$in": dead}}]}
+    failed = jobs_collection.update_many(
+        {**stale, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+        {"$set": {"status": "error", "error": "Worker lost too many times", "finished_at": time.time()}},
+    )
+    requeued = jobs_collection.update_many(stale, {"$set": {"status": "queued"}, "$unset": {"worker": ""}})
+    if requeued.modified_count or failed.modified_count:
+        print(f"[job queue] requeued {requeued.modified_count} stale jobs, "
+              f"gave up on {failed.modified_count}")
+
+
+def ensure_workers():
+    """
+    Starts the worker processes, replacing any that have died.
+    """
+    # Only the serving process owns workers; spawned children re-import this module
+    if multiprocessing.parent_process() is not None:
+        return
+    # Under the Werkzeug reloader only the inner serving process should start workers
+    if os.getenv("FLASK_ENV") == "development" and os.getenv("WERKZEUG_RUN_MAIN") != "true":
+        return
+
+    with _workers_lock:
+        for index in range(JOB_WORKERS):
+            worker = _workers.get(index)
+            if worker is not None and worker.is_alive():
+                continue
+            worker = multiprocessing.get_context("spawn").Process(
+                target=_worker_main, args=(index,), name=f"job-worker-{index}"
+            )
+            worker.start()
+            _workers[index] = worker
+
+
+def _supervise():
+    """
+    Keeps recovering interrupted jobs and replacing dead workers while the server runs.
+    """
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            ensure_workers()
+            recover_stale_jobs()
+        except Exception as e:
+            print(f"[job queue] supervision failed: {str(e)}")
+
+
+def start_workers():
+    """
+    Recovers interrupted jobs, starts the worker pool and keeps both healthy.
+    """
+    global _supervisor
+    if multiprocessing.parent_process() is not None:
+        return
+    jobs_collection.create_index([("status", ASCENDING), ("priority", DESCENDING), ("enqueued_at", ASCENDING)])
+    jobs_collection.create_index("job_id", unique=True)
+    recover_stale_jobs()
+    ensure_workers()
+    if _supervisor is None:
+        _supervisor = threading.Thread(target=_supervise, name="job-queue-supervisor", daemon=True)
+        _supervisor.start()
+
+
+def queue_metrics():
+    """
+    Summarizes queue depth, wait times and worker health.
+    """
+    now = time.time()
+    counts = {doc["_id"]: doc["count"] for doc in jobs_collection.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ])}
+
+    oldest = jobs_collection.find_one(
+        {"status": "queued"}, {"enqueued_at": 1}, sort=[("enqueued_at", ASCENDING)]
+    )
+    recent = list(jobs_collection.find(
+        {"started_at": {"$exists": True}},
+        {"enqueued_at": 1, "started_at": 1, "finished_at": 1},
+    ).sort("started_at", DESCENDING).limit(50))
+
+    waits = [job["started_at"] - job["enqueued_at"] for job in recent]
+    runs = [job["finished_at"] - job["started_at"] for job in recent if "finished_at" in job]
+
+    with _workers_lock:
+        alive = sum(1 for worker in _workers.values() if worker.is_alive())
+
+    return {
+        "depth": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "errored": counts.get("error", 0),
+        "max_depth": JOB_QUEUE_MAX_DEPTH,
+        "oldest_wait_seconds": round(now - oldest["enqueued_at"], 1) if oldest else 0,
+        "avg_wait_seconds": round(sum(waits) / len(waits), 1) if waits else 0,
+        "max_wait_seconds": round(max(waits), 1) if waits else 0,
+        "avg_run_seconds": round(sum(runs) / len(runs), 1) if runs else 0,
+        "workers": JOB_WORKERS,
+        "workers_alive": alive,
+    }
@@ -0,0 +1,397 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from contextlib import contextmanager
+import google.generativeai as genai
+from google.generativeai.types import RequestOptions
+from google.api_core import exceptions as google_exceptions
+from pymongo import MongoClient
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# One Gemini client per process; limits are per process, so split the quota across workers
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_RATE_PER_MINUTE = float(os.getenv("LLM_RATE_PER_MINUTE", 60))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 120))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 300))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", 1000))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+LLM_CACHE_MONGO = os.getenv("LLM_CACHE_MONGO", "true").lower() == "true"
+
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 120]
+
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+genai.configure(api_key=GEMINI_API_KEY)
+
+if LLM_CACHE_MONGO:
+    mongo_client = MongoClient(os.getenv("MONGO_URI"))
+    response_cache_collection = mongo_client.get_default_database().llm_response_cache
+else:
+    response_cache_collection = None
+
+
+class LLMBusyError(Exception):
+    """
+    Raised when a call waited too long for a free slot.
+    """
+
+
+class CachedResponse:
+    """
+    Stands in for a GenerateContentResponse served from the response cache.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ResponseCache:
+    """
+    Caches response text by (model, generation_config, prompt), with a TTL.
+
+    An in-process LRU sits in front of an optional Mongo collection shared by all workers;
+    Mongo removes expired documents itself through a TTL index on expires_at.
+    """
+
+    def __init__(self, collection=None, size=LLM_CACHE_SIZE):
+        self.collection = collection
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "mongo_hits": 0, "misses": 0}
+        if collection is not None:
+            try:
+                collection.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as e:
+                print(f"Response cache TTL index could not be created: {str(e)}")
+
+    @staticmethod
+    def key(model_name, generation_config, contents):
+        """
+        Hashes a request, or returns None if it has parts (e.g. uploaded files) that cannot be hashed.
+        """
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        if not all(isinstance(part, str) for part in parts):
+            return None
+        source = json.dumps([model_name, generation_config or {}, list(parts)], sort_keys=True, default=str)
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Returns cached response text, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+
+        doc = None
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({
+                    "_id": key,
+                    "expires_at": {"$gt": datetime.fromtimestamp(now, timezone.utc)}
+                })
+            except Exception as e:
+                print(f"Response cache lookup failed: {str(e)}")
+
+        with self._lock:
+            if doc is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["mongo_hits"] += 1
+            # Mongo returns naive UTC datetimes
+            self._remember(key, doc["text"], doc["expires_at"].replace(tzinfo=timezone.utc).timestamp())
+        return doc["text"]
+
+    def put(self, key, text, ttl):
+        """
+        Stores response text for ttl seconds.
+        """
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, text, expires_at)
+        if self.collection is not None:
+            try:
+                self.collection.replace_one(
+                    {"_id": key},
+                    {"text": text, "expires_at": datetime.fromtimestamp(expires_at, timezone.utc)},
+                    upsert=True
+                )
+            except Exception as e:
+                print(f"Response cache write failed: {str(e)}")
+
+    def _remember(self, key, text, expires_at):
+        self._entries[key] = (text, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def metrics(self):
+        """
+        Reports hits, misses and the hit rate.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["mongo_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["mongo_hits"]) / lookups, 3) if lookups else 0
+        return stats
+
+
+class RateLimiter:
+    """
+    Token bucket allowing `rate_per_minute` calls per minute with short bursts.
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, int(rate_per_minute // 6))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Blocks until a call is allowed.
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_limiter = RateLimiter(LLM_RATE_PER_MINUTE)
+_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+_models = {}
+_cache = ResponseCache(response_cache_collection)
+_lock = threading.Lock()
+_stats = {
+    "calls": 0,
+    "errors": 0,
+    "retries": 0,
+    "rate_limited": 0,
+    "rejected": 0,
+    "waiting": 0,
+    "in_flight": 0,
+    "tokens_in": 0,
+    "tokens_out": 0,
+    "latency_seconds_total": 0.0,
+}
+_latency_counts = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+def available():
+    """
+    Checks whether Gemini is configured for this process.
+    """
+    return bool(GEMINI_API_KEY)
+
+
+def get_model(model_name=None):
+    """
+    Returns the shared GenerativeModel instance for a model name.
+    """
+    model_name = model_name or GEMINI_MODEL
+    with _lock:
+        if model_name not in _models:
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+
+def _record(latency, response=None, error=False):
+    usage = getattr(response, "usage_metadata", None)
+    bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS) if latency <= bound), len(LATENCY_BUCKETS))
+    with _lock:
+        _stats["calls"] += 1
+        _stats["latency_seconds_total"] += latency
+        _latency_counts[bucket] += 1
+        if error:
+            _stats["errors"] += 1
+        if usage is not None:
+            _stats["tokens_in"] += getattr(usage, "prompt_token_count", 0) or 0
+            _stats["tokens_out"] += getattr(usage, "candidates_token_count", 0) or 0
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+@contextmanager
+def _slot():
+    """
+    Holds one of the LLM_MAX_CONCURRENCY call slots, queueing for up to LLM_QUEUE_TIMEOUT_SECONDS.
+    """
+    _count("waiting")
+    acquired = _slots.acquire(timeout=LLM_QUEUE_TIMEOUT_SECONDS)
+    _count("waiting", -1)
+    if not acquired:
+        _count("rejected")
+        raise LLMBusyError(f"Gemini is busy; no slot freed up within {LLM_QUEUE_TIMEOUT_SECONDS:.0f}s")
+
+    _count("in_flight")
+    try:
+        yield
+    finally:
+        _count("in_flight", -1)
+        _slots.release()
+
+
+def _retry(fn):
+    """
+    Runs fn under the rate limit, retrying transient errors with jittered exponential backoff.
+
+    Returns:
+        tuple: (result, monotonic start time of the successful attempt)
+    """
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        _limiter.acquire()
+        started = time.monotonic()
+        try:
+            return fn(), started
+        except RETRYABLE_ERRORS as e:
+            _record(time.monotonic() - started, error=True)
+            if isinstance(e, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+                _count("rate_limited")
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            delay = min(60, 2 * 2 ** attempt) + random.uniform(0, 1)
+            print(f"Gemini call failed ({str(e)}), retrying in {delay:.1f}s")
+            _count("retries")
+            time.sleep(delay)
+        except Exception:
+            _record(time.monotonic() - started, error=True)
+            raise
+
+
+def _call(fn):
+    """
+    Runs one Gemini call inside a concurrency slot and the rate limit, retrying transient errors.
+    """
+    with _slot():
+        response, started = _retry(fn)
+        _record(time.monotonic() - started, response)
+        return response
+
+
+def generate(contents, generation_config=None, model_name=None, timeout=LLM_TIMEOUT_SECONDS,
+             cache=False, cache_ttl=LLM_CACHE_TTL_SECONDS):
+    """
+    Generates content with the shared Gemini model.
+
+    Args:
+        contents: Prompt string or list of parts, as accepted by generate_content
+        generation_config (dict): Optional generation settings such as temperature
+        model_name (str): Model to use instead of GEMINI_MODEL
+        timeout (float): Per-attempt request timeout in seconds
+        cache (bool): Serve and store the response in the response cache; only for
+            calls whose answer depends on nothing but the prompt
+        cache_ttl (float): Seconds a cached response stays valid
+
+    Returns:
+        GenerateContentResponse: The model response, or a CachedResponse with the same text
+    """
+    model_name = model_name or GEMINI_MODEL
+    key = ResponseCache.key(model_name, generation_config, contents) if cache else None
+    if key:
+        text = _cache.get(key)
+        if text is not None:
+            return CachedResponse(text)
+
+    model = get_model(model_name)
+    response = _call(lambda: model.generate_content(
+        contents,
+        generation_config=generation_config,
+        request_options=RequestOptions(timeout=timeout)
+    ))
+    if key:
+        _cache.put(key, response.text, cache_ttl)
+    return response
+
+
+def generate_stream(contents, generation_config=None, model_name=None, timeout=LLM_TIMEOUT_SECONDS):
+    """
+    Streams generated text as it arrives, holding a concurrency slot until the stream ends.
+
+    Only opening the stream is retried; closing the generator early stops reading the response.
+
+    Yields:
+        str: Text of each streamed response chunk
+    """
+    model = get_model(model_name)
+
+    def open_stream():
+        response = iter(model.generate_content(
+            contents,
+            generation_config=generation_config,
+            request_options=RequestOptions(timeout=timeout),
+            stream=True
+        ))
+        return response, next(response, None)
+
+    with _slot():
+        (response, chunk), started = _retry(open_stream)
+        last = chunk
+        try:
+            while chunk is not None:
+                yield chunk.text
+                last = chunk
+                chunk = next(response, None)
+        except GeneratorExit:
+            # The consumer went away; stop reading and count what was streamed
+            _record(time.monotonic() - started, last)
+            raise
+        except Exception:
+            _record(time.monotonic() - started, error=True)
+            raise
+        # Usage metadata arrives with the final chunk
+        _record(time.monotonic() - started, last)
+
+
+def metrics():
+    """
+    Reports call counts, token usage, 429s, a latency histogram and response cache hits for this process.
+    """
+    with _lock:
+        stats = dict(_stats)
+        counts = list(_latency_counts)
+    stats["latency_seconds_total"] = round(stats["latency_seconds_total"], 3)
+    stats["avg_latency_seconds"] = round(stats["latency_seconds_total"] / stats["calls"], 3) if stats["calls"] else 0
+    # Cumulative buckets, as in a Prometheus histogram
+    running = 0
+    stats["latency_histogram"] = {}
+    for bound, count in zip(LATENCY_BUCKETS + ["inf"], counts):
+        running += count
+        stats["latency_histogram"][f"le_{bound}"] = running
+    stats["max_concurrency"] = LLM_MAX_CONCURRENCY
+    stats["rate_per_minute"] = LLM_RATE_PER_MINUTE
+    stats["response_cache"] = _cache.metrics()
+    return stats
@@ -1,50 +1,25 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-import google.generativeai as genai
 import os
+import re
+import translation
+import llm
+import transcript_digest
+import prompt_budget
+import generation_jobs
 import copy
+import json
+from concurrent.futures import ThreadPoolExecutor
 
 
 notes_route = Blueprint("notes", __name__)
 
-# Get API key from environment instead of hardcoding
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# Map-reduce settings for notes on long transcripts
+NOTES_CHUNK_CHARS = int(os.environ.get('NOTES_CHUNK_CHARS', 8000))
+NOTES_REDUCE_CHARS = int(os.environ.get('NOTES_REDUCE_CHARS', 30000))
+NOTES_MAP_CONCURRENCY = int(os.environ.get('NOTES_MAP_CONCURRENCY', 4))
 
-def summarize_transcript(transcript, max_length=40000):
-    """
-    Summarize long transcripts to a manageable length using semantic chunking.
-    
-    Args:
-        transcript (str): Original transcript text
-        max_length (int): Maximum desired length for the summary
-        
-    Returns:
-        str: Summarized transcript
-    """
-    if len(transcript) <= max_length:
-        return transcript
-    
-    # Create more specific summary prompt with instructions for preserving key information
-    summary_prompt = f"""
-    Please provide a comprehensive summary of the following lecture transcript.
-    Focus on:
-    1. Main concepts, theories, and frameworks
-    2. Key definitions and technical terms
-    3. Important examples and case studies
-    4. Major arguments and conclusions
-    
-    Transcript:
-    {transcript}
-    
-    Maintain academic tone and preserve technical accuracy while reducing length.
-    """
-    
-    response = model.generate_content(summary_prompt, 
-                                     generation_config={"temperature": 0.2})  # Lower temperature for accuracy
-    return response.text
 
 def extract_lecture_metadata(transcript):
     """
@@ -68,7 +43,7 @@ def extract_lecture_metadata(transcript):
     {transcript[:20000]}  # Use beginning of transcript for efficiency
     """
     
-    response = model.generate_content(metadata_prompt)
+    response = llm.generate(metadata_prompt, cache=True)
     try:
         # Parse JSON response or return empty dict if parsing fails
         import json
@@ -76,7 +51,7 @@ def extract_lecture_metadata(transcript):
     except:
         return {}
 
-def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_length=8000):
+def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_tokens=prompt_budget.PROMPT_MAX_TOKENS, digest=None):
     """
     Create an optimized prompt for Gemini API to generate lecture notes with better
     context awareness and structure.
@@ -85,13 +60,14 @@ def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_len
         user_prompt (str): User's specific requirements for the notes
         transcript (str): Lecture transcript text
         last_notes (str, optional): Previous version of the notes if it exists
-        max_prompt_length (int): Maximum allowed prompt length
+        max_prompt_tokens (int): Token budget for the whole prompt
+        digest (dict, optional): Precomputed transcript digest with metadata and summaries
         
     Returns:
         str: Formatted prompt string for the API
     """
-    # Extract lecture metadata for better context
-    metadata = extract_lecture_metadata(transcript)
+    # Use the precomputed lecture metadata when there is a digest
+    metadata = digest["metadata"] if digest else extract_lecture_metadata(transcript)
     
     # Enhanced notes structure with more flexible formatting options
     NOTES_STRUCTURE = """
@@ -130,36 +106,26 @@ def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_len
     - Mathematical notation using LaTeX syntax when appropriate
     """
 
-    # Process previous notes if available
-    if last_notes:
-        # Extract section headers from previous notes for better context
-        import re
-        headers = re.findall(r'(?m)^#{1,3}\s+(.+)$', last_notes)
-        header_summary = "\n".join([f"- {h}" for h in headers[:10]])
-        
-        # Include a sample of previous content plus the structure
-        if len(last_notes) > 25000:
-            last_notes_sample = last_notes[:25000] + "\n...[Previous notes truncated]..."
-        else:
-            last_notes_sample = last_notes
-            
-        base_prompt = f"""
-        Generate comprehensive lecture notes based on the following requirements:
-        
-        USER REQUIREMENTS:
-        {user_prompt}
-        
+    def render(requirements, source):
+        lecture_context = f"""
         LECTURE CONTEXT:
         Subject: {metadata.get('subject', 'Not specified')}
         Level: {metadata.get('level', 'Not specified')}
-        Main Topics: {', '.join(metadata.get('main_topics', ['Not specified']))}
+        Main Topics: {', '.join(metadata.get('main_topics') or ['Not specified'])}
         Speaker: {metadata.get('speaker', 'Not specified')}
+        """
+        if last_notes:
+            return f"""
+        Generate comprehensive lecture notes based on the following requirements:
         
+        USER REQUIREMENTS:
+        {requirements}
+        {lecture_context}
         PREVIOUS NOTES STRUCTURE:
         {header_summary}
         
         PREVIOUS NOTES SAMPLE:
-        {last_notes_sample}
+        {source}
         
         {NOTES_STRUCTURE}
         
@@ -170,27 +136,14 @@ def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_len
         4. Add visual elements (tables, structured lists) to enhance comprehension
         5. Ensure all technical terms are accurately defined
         """
-    else:
-        # For new notes, use semantic chunking for transcript processing
-        if len(transcript) > 40000:
-            processed_transcript = summarize_transcript(transcript)
-        else:
-            processed_transcript = transcript
-        
-        base_prompt = f"""
+        return f"""
         Generate comprehensive academic lecture notes based on the transcript and requirements:
-        
-        LECTURE CONTEXT:
-        Subject: {metadata.get('subject', 'Not specified')}
-        Level: {metadata.get('level', 'Not specified')}
-        Main Topics: {', '.join(metadata.get('main_topics', ['Not specified']))}
-        Speaker: {metadata.get('speaker', 'Not specified')}
-        
+        {lecture_context}
         USER REQUIREMENTS:
-        {user_prompt}
+        {requirements}
         
         LECTURE TRANSCRIPT:
-        {processed_transcript}
+        {source}
         
         {NOTES_STRUCTURE}
         
@@ -203,19 +156,116 @@ def create_notes_prompt(user_prompt, transcript, last_notes=None, max_prompt_len
         6. Add references to source material where appropriate
         """
     
-    # Apply intelligent prompt optimization
-    if len(base_prompt) > max_prompt_length:
-        # Calculate how much to trim while preserving key sections
-        transcript_section = re.search(r'LECTURE TRANSCRIPT:\s*(.+?)(?=IMPORTANT INSTRUCTIONS|\Z)', base_prompt, re.DOTALL)
-        if transcript_section:
-            transcript_text = transcript_section.group(1)
-            if len(transcript_text) > (len(base_prompt) - max_prompt_length + 200):  # Add buffer
-                # Intelligently reduce transcript length
-                reduced_length = len(transcript_text) - (len(base_prompt) - max_prompt_length + 200)
-                reduced_transcript = transcript_text[:reduced_length] + "\n...[Transcript truncated]..."
-                base_prompt = base_prompt.replace(transcript_text, reduced_transcript)
-    
-    return base_prompt
+    # Extract section headers from previous notes for better context
+    headers = re.findall(r'(?m)^#{1,3}\s+(.+)$', last_notes or "")
+    header_summary = "\n".join([f"- {h}" for h in headers[:10]])
+    
+    # Spend the budget on the fixed template first, then the user's request, then the source text
+    budget = prompt_budget.PromptBudget(max_prompt_tokens)
+    budget.reserve(render("", ""))
+    requirements = budget.fit(user_prompt, share=0.2)
+    
+    if last_notes:
+        source = budget.fit(last_notes)
+    elif budget.fits(transcript):
+        source = transcript
+    else:
+        # Prefer the digest's summary and outline, which cover the whole lecture, over a partial transcript
+        query = " ".join([user_prompt] + list(metadata.get('main_topics') or []))
+        condensed = transcript_digest.digest_text(digest) if digest and digest.get("outline") else transcript
+        source = budget.select(condensed, query)
+    
+    return render(requirements, source)
+
+def split_transcript_chunks(transcript, max_chars=NOTES_CHUNK_CHARS):
+    """
+    Splits a transcript into chunks of whole segments (one per line) of at most max_chars.
+    
+    Args:
+        transcript (str): Plain transcript with one segment per line
+        max_chars (int): Maximum chunk length
+        
+    Returns:
+        list: Transcript chunks in order
+    """
+    chunks = []
+    current = ""
+    for line in transcript.splitlines(keepends=True):
+        if current and len(current) + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+def create_combine_prompt(sections):
+    """
+    Creates the prompt that merges partial notes into one cohesive document.
+    """
+    return f"""
+    Please combine and organize these note sections into a cohesive document:
+    
+    {chr(10).join(sections)}
+    """
+
+def combine_notes(sections):
+    """
+    Merges partial notes into one cohesive document with a single LLM call.
+    """
+    return llm.generate(create_combine_prompt(sections)).text
+
+def reduce_notes_sections(user_prompt, transcript, digest=None):
+    """
+    Writes notes for each transcript chunk concurrently, then combines neighbouring sections
+    in parallel rounds until the rest fits into one final combine call.
+    
+    Args:
+        user_prompt (str): User's specific requirements
+        transcript (str): Lecture transcript
+        digest (dict, optional): Precomputed transcript digest; metadata is extracted once without it
+        
+    Returns:
+        list: Sections left for the final combine (a single section needs no combining)
+    """
+    if not digest:
+        digest = {"metadata": extract_lecture_metadata(transcript)}
+    chunks = split_transcript_chunks(transcript)
+    
+    def write_chunk_notes(chunk):
+        prompt = create_notes_prompt(user_prompt, chunk, digest={"metadata": digest["metadata"]})
+        return llm.generate(prompt).text
+    
+    with ThreadPoolExecutor(max_workers=NOTES_MAP_CONCURRENCY) as executor:
+        sections = list(executor.map(write_chunk_notes, chunks))
+        
+        # Combine neighbouring sections in groups that fit the budget until one group is left
+        while len(sections) > 1:
+            groups = [[]]
+            for section in sections:
+                if len(groups[-1]) >= 2 and sum(map(len, groups[-1])) + len(section) > NOTES_REDUCE_CHARS:
+                    groups.append([])
+                groups[-1].append(section)
+            if len(groups) == 1:
+                return groups[0]
+            sections = list(executor.map(lambda group: combine_notes(group) if len(group) > 1 else group[0], groups))
+    
+    return sections
+
+def map_reduce_notes(user_prompt, transcript, digest=None):
+    """
+    Generates notes for a long transcript with a map-reduce over transcript chunks.
+    
+    Args:
+        user_prompt (str): User's specific requirements
+        transcript (str): Lecture transcript
+        digest (dict, optional): Precomputed transcript digest
+        
+    Returns:
+        str: Generated notes content
+    """
+    sections = reduce_notes_sections(user_prompt, transcript, digest)
+    return combine_notes(sections) if len(sections) > 1 else sections[0]
 
 def generate_notes(user_prompt, transcript, last_notes=None):
     """
@@ -232,7 +282,7 @@ def generate_notes(user_prompt, transcript, last_notes=None):
     prompt = create_notes_prompt(user_prompt, transcript, last_notes)
     
     # Use more sophisticated generation parameters
-    response = model.generate_content(
+    response = llm.generate(
         prompt,
         generation_config={
             "temperature": 0.3,  # Lower temperature for academic content
@@ -317,6 +367,143 @@ def get_notes_versions(lecture_id, user_id, limit=10):
     
     return list(versions)
 
+def load_notes_inputs(data, user_id, with_digest=True):
+    """
+    Validates a notes generation request and loads its transcript and digest.
+    Pass with_digest=False to leave the digest (which may need LLM calls) to a background job.
+    
+    Returns:
+        tuple: ((user_prompt, transcript, last_notes, lecture_id, digest), None) on success,
+            or (None, error response) when the request cannot be served
+    """
+    user_prompt = data.get("user_prompt")
+    last_notes = data.get("last_notes")
+    transcript = data.get("transcript")
+    lecture_id = data.get("lecture_id")
+    
+    # The transcript stored when the video was processed takes precedence over the request's
+    if lecture_id:
+        transcript = transcript_digest.load_transcript(lecture_id, user_id) or transcript
+    
+    # Validate required fields
+    if not user_prompt or not transcript or not lecture_id:
+        return None, (jsonify({
+            "error": "Missing required fields",
+            "message": "user_prompt, transcript, and lecture_id are required"
+        }), 400)
+    
+    # Get the lectures collection from the main app's MongoDB connection
+    from app import lectures_col
+    
+    lecture = lectures_col.find_one({"id": lecture_id, "userId": user_id})
+    if not lecture:
+        return None, (jsonify({"error": "Lecture not found or access denied"}), 404)
+    
+    digest = load_digest(lecture_id, user_id, transcript) if with_digest else None
+    return (user_prompt, transcript, last_notes, lecture_id, digest), None
+
+def load_digest(lecture_id, user_id, transcript):
+    """
+    Reuses the lecture's digest instead of extracting metadata and summaries per request.
+    """
+    try:
+        return transcript_digest.get_digest(lecture_id, user_id, transcript)
+    except Exception as e:
+        print(f"Transcript digest unavailable: {str(e)}")
+        return None
+
+def generate_and_save_notes(user_id, user_prompt, transcript, last_notes, lecture_id, digest):
+    """
+    Generates notes, stores them and returns the response body shared by the sync and async routes.
+    """
+    # Handle very long inputs with a map-reduce over transcript chunks
+    if len(transcript) > 12000 and not last_notes:  # If transcript is extremely long
+        notes_content = map_reduce_notes(user_prompt, transcript, digest)
+    else:
+        prompt = create_notes_prompt(user_prompt, transcript, last_notes, digest=digest)
+        response = llm.generate(prompt)
+        notes_content = response.text
+
+    notes_id, version_id = save_generated_notes(lecture_id, user_id, notes_content)
+
+    return {
+        "status": "success",
+        "timestamp": datetime.now().isoformat(),
+        "notes_content": notes_content,
+        "id": notes_id,
+        "version_id": version_id,
+        "metadata": {
+            "model_used": "gemini-1.5-flash",
+            "processed_length": len(transcript)
+        }
+    }
+
+def notes_request_key(user_id, user_prompt, transcript, last_notes, lecture_id):
+    """
+    Identifies identical notes requests so duplicates share one generation.
+    """
+    return generation_jobs.request_key("notes", user_id, lecture_id, user_prompt, transcript, last_notes)
+
+def run_notes_job(user_id, user_prompt, transcript, last_notes, lecture_id, report):
+    """
+    Background job body for /generate/async.
+    """
+    report("digesting_transcript", 10)
+    digest = load_digest(lecture_id, user_id, transcript)
+    report("generating", 30)
+    return generation_jobs.coalesce(
+        notes_request_key(user_id, user_prompt, transcript, last_notes, lecture_id),
+        generate_and_save_notes, user_id, user_prompt, transcript, last_notes, lecture_id, digest
+    )
+
+def save_generated_notes(lecture_id, user_id, notes_content):
+    """
+    Stores newly generated notes as the current version and in the history.
+    
+    Returns:
+        tuple: (notes ID, version ID)
+    """
+    from app import notes_col
+    
+    # Create version ID for this new generation
+    version_id = f"note_{lecture_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    
+    # Create notes document with user information
+    notes_document = {
+        "lecture_id": lecture_id,
+        "notes_content": notes_content,
+        "userId": user_id,
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat(),
+        "id": f"note_{lecture_id}",  # Unique ID for the notes
+        "version_id": version_id     # Add version ID to main document
+    }
+    
+    # Check if notes for this lecture already exist
+    existing_notes = notes_col.find_one({"lecture_id": lecture_id, "userId": user_id})
+    
+    if existing_notes:
+        # Always save each generation to history
+        save_notes_history(lecture_id, user_id, notes_content)
+        
+        # Update existing notes
+        notes_col.update_one(
+            {"lecture_id": lecture_id, "userId": user_id},
+            {"$set": {
+                "notes_content": notes_content,
+                "updated_at": datetime.now().isoformat(),
+                "version_id": version_id
+            }}
+        )
+    else:
+        # Insert new notes
+        notes_col.insert_one(notes_document)
+        
+        # Also save to history for the first generation
+        save_notes_history(lecture_id, user_id, notes_content)
+    
+    return notes_document["id"], version_id
+
 @notes_route.route("/generate", methods=["POST"])
 @jwt_required()
 def gen_notes():
@@ -331,97 +518,17 @@ def gen_notes():
             }), 401
         user_id = current_user.get('userId') or current_user.get('email')
         
-        data = request.get_json()
-        user_prompt = data.get("user_prompt")
-        last_notes = data.get("last_notes")
-        transcript = data.get("transcript")
-        lecture_id = data.get("lecture_id")
+        inputs, error = load_notes_inputs(request.get_json(), user_id)
+        if error:
+            return error
+        user_prompt, transcript, last_notes, lecture_id, digest = inputs
         
-        # Validate required fields
-        if not user_prompt or not transcript or not lecture_id:
-            return jsonify({
-                "error": "Missing required fields",
-                "message": "user_prompt, transcript, and lecture_id are required"
-            }), 400
-        
-        # Get the notes collection from the main app's MongoDB connection
-        from app import mongo, notes_col, lectures_col
-        
-        lecture = lectures_col.find_one({"id": lecture_id, "userId": user_id})
-        if not lecture:
-            return jsonify({"error": "Lecture not found or access denied"}), 404
-        
-        # Handle very long inputs in chunks if necessary
-        if len(transcript) > 12000:  # If transcript is extremely long
-            notes_sections = []
-            chunk_size = 8000
-            for i in range(0, len(transcript), chunk_size):
-                chunk = transcript[i:i + chunk_size]
-                prompt = create_notes_prompt(user_prompt, chunk)
-                response = model.generate_content(prompt)
-                notes_sections.append(response.text)
-            
-            # Combine the sections
-            combine_prompt = f"""
-            Please combine and organize these note sections into a cohesive document:
-            
-            {' '.join(notes_sections)}
-            """
-            final_response = model.generate_content(combine_prompt)
-            notes_content = final_response.text
-        else:
-            prompt = create_notes_prompt(user_prompt, transcript, last_notes)
-            response = model.generate_content(prompt)
-            notes_content = response.text
-
-        # Create version ID for this new generation
-        version_id = f"note_{lecture_id}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        
-        # Create notes document with user information
-        notes_document = {
-            "lecture_id": lecture_id,
-            "notes_content": notes_content,
-            "userId": user_id,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "id": f"note_{lecture_id}",  # Unique ID for the notes
-            "version_id": version_id     # Add version ID to main document
-        }
-        
-        # Check if notes for this lecture already exist
-        existing_notes = notes_col.find_one({"lecture_id": lecture_id, "userId": user_id})
-        
-        if existing_notes:
-            # Always save each generation to history
-            save_notes_history(lecture_id, user_id, notes_content)
-            
-            # Update existing notes
-            notes_col.update_one(
-                {"lecture_id": lecture_id, "userId": user_id},
-                {"$set": {
-                    "notes_content": notes_content,
-                    "updated_at": datetime.now().isoformat(),
-                    "version_id": version_id
-                }}
-            )
-        else:
-            # Insert new notes
-            notes_col.insert_one(notes_document)
-            
-            # Also save to history for the first generation
-            save_notes_history(lecture_id, user_id, notes_content)
-
-        return jsonify({
-            "status": "success",
-            "timestamp": datetime.now().isoformat(),
-            "notes_content": notes_content,
-            "id": notes_document["id"],
-            "version_id": version_id,
-            "metadata": {
-                "model_used": "gemini-1.5-flash",
-                "processed_length": len(transcript)
-            }
-        }), 200
+        # A double-click or a second tab attaches to the generation already in flight
+        result = generation_jobs.coalesce(
+            notes_request_key(user_id, user_prompt, transcript, last_notes, lecture_id),
+            generate_and_save_notes, user_id, user_prompt, transcript, last_notes, lecture_id, digest
+        )
+        return jsonify(result), 200
         
     except Exception as e:
         return jsonify({
@@ -429,6 +536,89 @@ def gen_notes():
             "message": str(e)
         }), 500
 
+@notes_route.route("/generate/async", methods=["POST"])
+@jwt_required()
+def gen_notes_async():
+    """
+    Queue notes generation in the background; poll /jobs/<job_id> for the result.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    inputs, error = load_notes_inputs(request.get_json(), user_id, with_digest=False)
+    if error:
+        return error
+    user_prompt, transcript, last_notes, lecture_id, _ = inputs
+    
+    try:
+        job_id = generation_jobs.submit("notes", user_id, run_notes_job,
+                                        user_id, user_prompt, transcript, last_notes, lecture_id,
+                                        key=notes_request_key(user_id, user_prompt, transcript, last_notes, lecture_id))
+    except generation_jobs.TooManyJobsError as e:
+        return jsonify({"error": "Too many generation jobs", "message": str(e)}), 429
+    
+    return jsonify({"status": "queued", "job_id": job_id}), 202
+
+@notes_route.route("/generate/stream", methods=["POST"])
+@jwt_required()
+def gen_notes_stream():
+    """
+    Generate notes like /generate, streaming the text as Server-Sent Events while Gemini writes it.
+    The notes are saved once the stream completes; nothing is saved if the client disconnects.
+    """
+    current_user = get_jwt_identity()
+    if not current_user:
+        return jsonify({
+            "error": "Authentication required",
+            "message": "Valid JWT token is required for this endpoint"
+        }), 401
+    user_id = current_user.get('userId') or current_user.get('email')
+    
+    inputs, error = load_notes_inputs(request.get_json(), user_id)
+    if error:
+        return error
+    user_prompt, transcript, last_notes, lecture_id, digest = inputs
+    
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+    
+    def generate():
+        pieces = None
+        try:
+            if len(transcript) > 12000 and not last_notes:
+                # Map the chunks first, then stream the final combine
+                yield event("progress", {"stage": "summarizing_sections"})
+                sections = reduce_notes_sections(user_prompt, transcript, digest)
+                pieces = llm.generate_stream(create_combine_prompt(sections)) if len(sections) > 1 else iter(sections)
+            else:
+                pieces = llm.generate_stream(create_notes_prompt(user_prompt, transcript, last_notes, digest=digest))
+            
+            parts = []
+            for piece in pieces:
+                parts.append(piece)
+                yield event("delta", {"text": piece})
+            notes_content = "".join(parts)
+            
+            notes_id, version_id = save_generated_notes(lecture_id, user_id, notes_content)
+            yield event("complete", {
+                "status": "success",
+                "timestamp": datetime.now().isoformat(),
+                "id": notes_id,
+                "version_id": version_id
+            })
+        except Exception as e:
+            yield event("error", {"error": "Notes generation failed", "message": str(e)})
+        finally:
+            # Stops reading from Gemini when the client disconnects mid-stream
+            if hasattr(pieces, "close"):
+                pieces.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @notes_route.route("/update/<lecture_id>", methods=["PUT"])
 @jwt_required()
 def update_notes(lecture_id):
@@ -941,33 +1131,14 @@ def translate_with_gemini(content, target_language):
         str: Translated content
     """
     try:
-        # For very large content, we need to split it
-        if len(content) > 30000:
-            chunks = [content[i:i+30000] for i in range(0, len(content), 30000)]
-            translated_chunks = []
-            
-            for chunk in chunks:
-                prompt = f"""
-                Translate the following text to {target_language}. 
-                Preserve all formatting, including markdown syntax, code blocks, and special characters.
-                
-                TEXT TO TRANSLATE:
-                {chunk}
-                """
-                response = model.generate_content(prompt, generation_config={"temperature": 0.1})
-                translated_chunks.append(response.text)
-            
-            return ''.join(translated_chunks)
-        else:
-            prompt = f"""
-            Translate the following text to {target_language}.
-            Preserve all formatting, including markdown syntax, code blocks, and special characters.
-            
-            TEXT TO TRANSLATE:
-            {content}
-            """
-            response = model.generate_content(prompt, generation_config={"temperature": 0.1})
-            return response.text
+        # Split on markdown blocks and translate the pieces concurrently, in order
+        return translation.translate(
+            content,
+            target_language,
+            instructions="""Preserve all formatting, including markdown syntax, code blocks, and special characters.""",
+            markdown=True,
+            generation_config={"temperature": 0.1}
+        )
     except Exception as e:
         print(f"Translation error: {str(e)}")
         return content
@@ -0,0 +1,160 @@
+import os
+import re
+import math
+from functools import lru_cache
+import llm
+
+# "local" approximates Gemini's tokenizer; "gemini" asks the API (exact, but one request per text)
+PROMPT_TOKEN_COUNTER = os.getenv("PROMPT_TOKEN_COUNTER", "local")
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", 12000))
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+WORD_PATTERN = re.compile(r"\w+")
+GOLDEN_RATIO = (math.sqrt(5) - 1) / 2
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "in", "include", "is", "it",
+    "make", "me", "notes", "of", "on", "or", "please", "quiz", "the", "this", "to", "what", "with", "about",
+}
+
+
+@lru_cache(maxsize=4096)
+def _approximate_tokens(text):
+    """
+    Estimates tokens: about 4 characters per token for Latin-script words, 2 for other scripts.
+    """
+    tokens = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        piece = match.group()
+        per_token = 4 if piece.isascii() else 2
+        tokens += max(1, math.ceil(len(piece) / per_token))
+    return tokens
+
+
+@lru_cache(maxsize=4096)
+def _gemini_tokens(text):
+    return llm.get_model().count_tokens(text).total_tokens
+
+
+def count_tokens(text):
+    """
+    Counts the tokens of a text with the configured counter.
+    """
+    if not text:
+        return 0
+    if PROMPT_TOKEN_COUNTER == "gemini":
+        try:
+            return _gemini_tokens(text)
+        except Exception as e:
+            print(f"Token count failed, using the local estimate: {str(e)}")
+    return _approximate_tokens(text)
+
+
+def fit_text(text, max_tokens, marker="...[truncated]..."):
+    """
+    Keeps whole lines from the start of a text until max_tokens is reached.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    kept, used = [], count_tokens(marker)
+    for line in text.splitlines():
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept + [marker])
+
+
+def select_segments(text, max_tokens, query=""):
+    """
+    Picks the transcript segments (lines) most relevant to a query that fit in max_tokens.
+
+    Segments are ranked by overlap with the query's terms; ties are broken by spreading picks
+    evenly across the lecture. The chosen segments keep their original order, with gaps marked.
+
+    Args:
+        text (str): Transcript with one segment per line
+        max_tokens (int): Token budget for the selection
+        query (str): Text describing what the prompt is about, e.g. the user's request
+
+    Returns:
+        str: The selected segments
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    segments = [line for line in text.splitlines() if line.strip()]
+    terms = {word for word in WORD_PATTERN.findall(query.lower()) if word not in STOPWORDS}
+
+    def score(index):
+        words = WORD_PATTERN.findall(segments[index].lower())
+        overlap = sum(1 for word in words if word in terms)
+        return overlap / math.sqrt(len(words) or 1)
+
+    # The golden-ratio sequence visits positions in an evenly spread order
+    order = sorted(range(len(segments)), key=lambda i: (-score(i), (i * GOLDEN_RATIO) % 1))
+    gap_cost = count_tokens("[...]") + 1
+    chosen, used = set(), gap_cost
+    for index in order:
+        # Every pick may open a gap, so budget a marker with it
+        cost = count_tokens(segments[index]) + 1 + gap_cost
+        if used + cost > max_tokens:
+            continue
+        chosen.add(index)
+        used += cost
+
+    lines, previous = [], -1
+    for index in sorted(chosen):
+        if index != previous + 1:
+            lines.append("[...]")
+        lines.append(segments[index])
+        previous = index
+    if previous != len(segments) - 1:
+        lines.append("[...]")
+    return "\n".join(lines)
+
+
+class PromptBudget:
+    """
+    Hands out a prompt's token budget section by section.
+
+    Reserve the fixed parts of the prompt first, then fit each variable section into a share of
+    what is left, so the total never exceeds max_tokens.
+    """
+
+    def __init__(self, max_tokens=PROMPT_MAX_TOKENS):
+        self.max_tokens = max_tokens
+        self.remaining = max_tokens
+
+    def reserve(self, text):
+        """
+        Accounts for text that is always sent in full, such as instructions.
+        """
+        self.remaining -= count_tokens(text)
+        return text
+
+    def _allowance(self, share, cap):
+        allowance = int(max(0, self.remaining) * share)
+        return min(allowance, cap) if cap else allowance
+
+    def fit(self, text, share=1.0, cap=None):
+        """
+        Truncates text at a line boundary to a share of the remaining budget.
+        """
+        text = fit_text(text or "", self._allowance(share, cap))
+        self.remaining -= count_tokens(text)
+        return text
+
+    def select(self, text, query="", share=1.0, cap=None):
+        """
+        Fits a transcript into a share of the remaining budget by picking relevant segments.
+        """
+        text = select_segments(text or "", self._allowance(share, cap), query)
+        self.remaining -= count_tokens(text)
+        return text
+
+    def fits(self, text, share=1.0):
+        """
+        Checks whether text fits into a share of the remaining budget as is.
+        """
+        return count_tokens(text) <= self._allowance(share, None)
@@ -0,0 +1,155 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import llm
+
+load_dotenv()
+
+# Questions are classified in batches with one structured call each; only items that come back
+# missing or malformed are retried one by one, concurrently
+QUESTION_BATCH_SIZE = int(os.getenv("QUESTION_BATCH_SIZE", 50))
+QUESTION_FALLBACK_CONCURRENCY = int(os.getenv("QUESTION_FALLBACK_CONCURRENCY", 4))
+
+ANSWERS = ("yes", "no")
+
+QUESTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "index": {"type": "integer"},
+        "answer": {"type": "string", "enum": list(ANSWERS)},
+        "topics": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["index", "answer", "topics"],
+}
+
+BATCH_CONFIG = {
+    "temperature": 0,
+    "response_mime_type": "application/json",
+    "response_schema": {"type": "array", "items": QUESTION_SCHEMA},
+}
+
+SINGLE_CONFIG = {
+    "temperature": 0,
+    "response_mime_type": "application/json",
+    "response_schema": QUESTION_SCHEMA,
+}
+
+
+def _parse_json(text):
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def _validate(item):
+    """
+    Returns a normalized {answer, topics} dict, or None if the item is malformed.
+    """
+    if not isinstance(item, dict):
+        return None
+    answer = str(item.get("answer", "")).strip().lower()
+    topics = item.get("topics")
+    if answer not in ANSWERS or not isinstance(topics, list):
+        return None
+    return {"answer": answer, "topics": [str(topic).strip() for topic in topics if str(topic).strip()]}
+
+
+def classify_batch(questions):
+    """
+    Asks for the correct yes/no answer and 2-4 topics of every question in one call.
+
+    Returns:
+        dict: Position in `questions` -> {answer, topics} for each valid item returned
+    """
+    numbered = "\n".join(f"{index}. {question}" for index, question in enumerate(questions))
+    prompt = f"""
+    For each numbered yes/no question below, give:
+    - index: The question's number
+    - answer: The correct answer, "yes" or "no"
+    - topics: 2 to 4 short academic topics the question relates to, e.g. "Machine Learning", "Geography"
+
+    Return one object per question.
+
+    Questions:
+    {numbered}
+    """
+    response = llm.generate(prompt, generation_config=BATCH_CONFIG, cache=True)
+    items = _parse_json(response.text)
+    if not isinstance(items, list):
+        return {}
+
+    results = {}
+    for item in items:
+        index = item.get("index") if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(questions):
+            valid = _validate(item)
+            if valid:
+                results[index] = valid
+    return results
+
+
+def classify_question(question):
+    """
+    Classifies a single question; used for items a batch did not return correctly.
+    """
+    prompt = f"""
+    For this yes/no question give:
+    - index: 0
+    - answer: The correct answer, "yes" or "no"
+    - topics: 2 to 4 short academic topics the question relates to
+
+    Question: {question}
+    """
+    try:
+        response = llm.generate(prompt, generation_config=SINGLE_CONFIG, cache=True)
+        valid = _validate(_parse_json(response.text))
+    except Exception as e:
+        print(f"Question classification failed: {str(e)}")
+        valid = None
+    # Anything but a clear "yes" was treated as "no" before batching, so keep that default
+    return valid or {"answer": "no", "topics": []}
+
+
+def classify_questions(questions):
+    """
+    Finds the correct answer and topic tags of every question.
+
+    Args:
+        questions (list): Question strings
+
+    Returns:
+        list: {answer, topics} for each question, in order
+    """
+    results = {}
+    for offset in range(0, len(questions), QUESTION_BATCH_SIZE):
+        batch = questions[offset:offset + QUESTION_BATCH_SIZE]
+        try:
+            found = classify_batch(batch)
+        except Exception as e:
+            print(f"Batched question classification failed: {str(e)}")
+            found = {}
+        results.update({offset + index: item for index, item in found.items()})
+
+    missing = [index for index in range(len(questions)) if index not in results]
+    if missing:
+        print(f"Classifying {len(missing)} questions individually...")
+        with ThreadPoolExecutor(max_workers=QUESTION_FALLBACK_CONCURRENCY) as executor:
+            for index, item in zip(missing, executor.map(classify_question, [questions[i] for i in missing])):
+                results[index] = item
+
+    return [results[index] for index in range(len(questions))]
+
+
+def collect_topics(classifications):
+    """
+    Merges the topic tags of several questions, keeping first-seen order.
+    """
+    topics = {}
+    for item in classifications:
+        for topic in item["topics"]:
+            topics.setdefault(topic.lower(), topic)
+    return list(topics.values())
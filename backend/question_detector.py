@@ -0,0 +1,189 @@
+import os
+import re
+import json
+from dotenv import load_dotenv
+import llm
+
+load_dotenv()
+
+# Seconds after a question during which raised hands count as answers
+QUESTION_ANSWER_WINDOW_SECONDS = float(os.getenv("QUESTION_ANSWER_WINDOW_SECONDS", 10))
+# A hand-raising prompt starting at most this many seconds after a question is merged into it
+QUESTION_FOLLOW_UP_SECONDS = float(os.getenv("QUESTION_FOLLOW_UP_SECONDS", 3))
+# Ask Gemini to confirm the shortlisted segments; without it the strongest candidates are kept
+QUESTION_CONFIRM = os.getenv("QUESTION_CONFIRM", "true").lower() == "true"
+QUESTION_MIN_SCORE = 2
+QUESTION_STRONG_SCORE = 4
+
+YES_NO_START = re.compile(
+    r"^(?:so,?\s+|now,?\s+|okay,?\s+|ok,?\s+|alright,?\s+)?"
+    r"(?:is|are|was|were|do|does|did|can|could|will|would|should|has|have|had|am)\b",
+    re.IGNORECASE,
+)
+WH_WORD = re.compile(r"\b(?:what|which|who|whom|whose|when|where|why|how)\b", re.IGNORECASE)
+HAND_CUE = re.compile(
+    r"\b(?:raise your hands?|hands? up|put your hands? up|show of hands|how many of you|"
+    r"who (?:thinks|agrees|knows|says)|anyone|anybody|everyone)\b",
+    re.IGNORECASE,
+)
+YES_NO_CUE = re.compile(r"\b(?:yes or no|true or false|right or wrong|agree or disagree)\b", re.IGNORECASE)
+
+CONFIRM_CONFIG = {
+    "temperature": 0,
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "index": {"type": "integer"},
+                "is_check_in": {"type": "boolean"},
+                "question": {"type": "string"},
+            },
+            "required": ["index", "is_check_in", "question"],
+        },
+    },
+}
+
+
+def settings():
+    """
+    Lists the settings detected questions and their windows depend on, e.g. to key cached results.
+    """
+    return [QUESTION_ANSWER_WINDOW_SECONDS, QUESTION_FOLLOW_UP_SECONDS, QUESTION_CONFIRM,
+            QUESTION_MIN_SCORE, QUESTION_STRONG_SCORE, llm.GEMINI_MODEL]
+
+
+def score_segment(text):
+    """
+    Scores how likely a transcript segment is a question put to the class.
+    """
+    text = text.strip()
+    score = 0
+    if text.endswith("?"):
+        score += 2
+    elif "?" in text:
+        score += 1
+    if YES_NO_START.search(text):
+        score += 2
+    elif WH_WORD.search(text):
+        score += 1
+    if HAND_CUE.search(text):
+        score += 2
+    if YES_NO_CUE.search(text):
+        score += 2
+    return score
+
+
+def find_candidates(segments, min_score=QUESTION_MIN_SCORE):
+    """
+    Shortlists transcript segments that look like questions and gives each an answer window.
+
+    Args:
+        segments (list): Dicts with text, start and end in seconds
+
+    Returns:
+        list: Dicts with index, question, score, start and end (the answer window)
+    """
+    candidates = []
+    question_end = None  # end of the last shortlisted segment, as opposed to its answer window
+    for index, segment in enumerate(segments):
+        text = segment.get("text", "").strip()
+        if not text:
+            continue
+        score = score_segment(text)
+        if score < min_score:
+            continue
+        start = segment.get("start") or 0
+        end = segment.get("end") or start
+        next_text = segments[index + 1]["text"].strip() if index + 1 < len(segments) else ""
+        # A prompt such as "raise your hand if..." right after a question belongs to it and
+        # moves its answer window later
+        previous = candidates[-1] if candidates else None
+        if (previous and "?" not in text and HAND_CUE.search(text)
+                and start - question_end <= QUESTION_FOLLOW_UP_SECONDS):
+            previous.update(
+                question=f"{previous['question']} {text}",
+                context=next_text,
+                score=max(previous["score"], score),
+                start=end,
+                end=end + QUESTION_ANSWER_WINDOW_SECONDS,
+            )
+            question_end = end
+            continue
+        candidates.append({
+            "index": index,
+            "question": text,
+            "context": next_text,
+            "score": score,
+            "start": end,
+            "end": end + QUESTION_ANSWER_WINDOW_SECONDS,
+        })
+        question_end = end
+    return candidates
+
+
+def confirm_candidates(candidates):
+    """
+    Asks Gemini which shortlisted segments are yes/no check-in questions, sending only those segments.
+
+    Returns:
+        dict: Position in `candidates` -> cleaned-up question text, for confirmed candidates
+    """
+    numbered = "\n".join(
+        f"{position}. {candidate['question']}\n   (next: {candidate['context']})"
+        for position, candidate in enumerate(candidates)
+    )
+    prompt = f"""
+    These lines come from a lecture transcript. For each numbered line decide whether the lecturer is
+    asking the class a question students can answer yes or no by raising their hands.
+    Return one object per line with:
+    - index: The line's number
+    - is_check_in: true if it is such a question
+    - question: The question rewritten as a short, self-contained yes/no question
+
+    Lines:
+    {numbered}
+    """
+    response = llm.generate(prompt, generation_config=CONFIRM_CONFIG, cache=True)
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", response.text.strip())
+    items = json.loads(text)
+
+    confirmed = {}
+    for item in items:
+        position = item.get("index")
+        if isinstance(position, int) and 0 <= position < len(candidates) and item.get("is_check_in"):
+            confirmed[position] = str(item.get("question") or candidates[position]["question"]).strip()
+    return confirmed
+
+
+def detect_questions(segments, confirm=QUESTION_CONFIRM):
+    """
+    Finds the check-in questions of a lecture and the windows in which students answer them.
+
+    Args:
+        segments (list): Timestamped transcript segments
+        confirm (bool): Confirm the shortlist with one inline Gemini call
+
+    Returns:
+        dict: {"questions": [{question: [start_time, end_time]}, ...]}
+    """
+    candidates = find_candidates(segments)
+    confirmed = None
+    if candidates and confirm:
+        try:
+            confirmed = confirm_candidates(candidates)
+        except Exception as e:
+            print(f"Question confirmation failed, keeping the strongest candidates: {str(e)}")
+    if confirmed is None:
+        confirmed = {
+            position: candidate["question"]
+            for position, candidate in enumerate(candidates)
+            if candidate["score"] >= QUESTION_STRONG_SCORE
+        }
+
+    questions = []
+    for position in sorted(confirmed):
+        candidate = candidates[position]
+        questions.append({confirmed[position]: [candidate["start"], candidate["end"]]})
+    return {"questions": questions}
@@ -1,45 +1,18 @@
-from flask import Blueprint, request, jsonify
-import google.generativeai as genai
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import os
+import translation
+import llm
+import transcript_digest
+import prompt_budget
+import generation_jobs
 import uuid
 import json
 
 quiz_route = Blueprint("quiz", __name__)
 
-# Get API key from environment instead of hardcoding
-GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
 
-def summarize_transcript_for_quiz(transcript, max_length=4000):
-    """
-    Summarize long transcripts while preserving key testable content.
-    
-    Args:
-        transcript (str): Original transcript text
-        max_length (int): Maximum desired length for the summary
-        
-    Returns:
-        str: Summarized transcript focused on quiz-worthy content
-    """
-    if len(transcript) <= max_length:
-        return transcript
-        
-    summary_prompt = f"""
-    Please provide a concise summary of the following lecture transcript, 
-    focusing specifically on key facts, concepts, and details that would be 
-    appropriate for quiz questions:
-    {transcript}
-    
-    Keep the summary focused on testable content.
-    """
-    
-    response = model.generate_content(summary_prompt)
-    return response.text
-
-def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="standard", difficulty="medium", max_prompt_length=8000):
+def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="standard", difficulty="medium", max_prompt_tokens=prompt_budget.PROMPT_MAX_TOKENS, digest=None):
     """
     Create an optimized prompt for Gemini API to generate quizzes.
     
@@ -49,7 +22,8 @@ def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="stand
         last_quiz (str, optional): Previous version of the quiz if it exists
         quiz_type (str): Type of quiz to generate (e.g., standard, multiple-choice, etc.)
         difficulty (str): Difficulty level of the quiz (e.g., easy, medium, hard)
-        max_prompt_length (int): Maximum allowed prompt length
+        max_prompt_tokens (int): Token budget for the whole prompt
+        digest (dict, optional): Precomputed transcript digest with summaries and outline
         
     Returns:
         str: Formatted prompt string for the API
@@ -71,17 +45,13 @@ def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="stand
     [Include correct answers at the end]
     """
 
-    if last_quiz:
-        # For updates, only include relevant sections of previous quiz
-        if len(last_quiz) > 2000:
-            # Extract questions and answers from previous quiz
-            last_quiz = last_quiz[:2000] + "\n...[Previous quiz truncated for brevity]..."
-            
-        base_prompt = f"""
+    def render(requirements, source):
+        if last_quiz:
+            return f"""
         Generate a quiz based on the following requirements:
         
         USER REQUIREMENTS:
-        {user_prompt}
+        {requirements}
         
         QUIZ TYPE: {quiz_type}
         DIFFICULTY: {difficulty}
@@ -89,22 +59,18 @@ def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="stand
         {QUIZ_STRUCTURE}
         
         PREVIOUS QUIZ:
-        {last_quiz}
+        {source}
         
         Please create a new version of the quiz that integrates the requirement of the user.
         """
-    else:
-        # For new quizzes, potentially summarize the transcript
-        processed_transcript = summarize_transcript_for_quiz(transcript) if len(transcript) > 4000 else transcript
-        
-        base_prompt = f"""
+        return f"""
         Generate a quiz based on the following lecture transcript and requirements:
         
         LECTURE TRANSCRIPT:
-        {processed_transcript}
+        {source}
         
         USER REQUIREMENTS:
-        {user_prompt}
+        {requirements}
         
         QUIZ TYPE: {quiz_type}
         DIFFICULTY: {difficulty}
@@ -112,13 +78,152 @@ def create_quiz_prompt(user_prompt, transcript, last_quiz=None, quiz_type="stand
         {QUIZ_STRUCTURE}
         """
     
-    # Final length check
-    if len(base_prompt) > max_prompt_length:
-        base_prompt = base_prompt[:max_prompt_length] + "\n...[Prompt truncated to meet length requirements]..."
+    # Spend the budget on the fixed template first, then the user's request, then the source text
+    budget = prompt_budget.PromptBudget(max_prompt_tokens)
+    budget.reserve(render("", ""))
+    requirements = budget.fit(user_prompt, share=0.2)
+    
+    if last_quiz:
+        source = budget.fit(last_quiz)
+    elif budget.fits(transcript):
+        source = transcript
+    else:
+        # Prefer the digest's summary and outline, which cover the whole lecture, over a partial transcript
+        condensed = transcript_digest.digest_text(digest) if digest else transcript
+        source = budget.select(condensed, user_prompt)
+    
+    base_prompt = render(requirements, source)
     
     return base_prompt
 
 
+def prepare_quiz_prompt(data, user_id):
+    """
+    Validates a quiz generation request and builds its prompt, reusing the lecture's digest.
+    
+    Returns:
+        tuple: (prompt, None) on success, or (None, error response)
+    """
+    user_prompt = data.get("user_prompt")
+    transcript = data.get("transcript")
+    last_quiz = data.get("last_notes")  # Matches frontend naming
+    lecture_id = data.get("lecture_id")
+    
+    # Validate required fields
+    if not user_prompt:
+        return None, (jsonify({
+            "error": "Missing required fields",
+            "message": "User prompt is required"
+        }), 400)
+    
+    # Add new parameters
+    quiz_type = data.get("quiz_type", "standard")
+    difficulty = data.get("difficulty", "medium")
+
+    # The transcript stored when the video was processed takes precedence over the request's
+    if lecture_id:
+        transcript = transcript_digest.load_transcript(lecture_id, user_id) or transcript
+    
+    # Reuse the lecture's digest instead of summarizing the transcript per request
+    digest = None
+    if lecture_id and transcript and not last_quiz and \
+            prompt_budget.count_tokens(transcript) > prompt_budget.PROMPT_MAX_TOKENS // 2:
+        try:
+            digest = transcript_digest.get_digest(lecture_id, user_id, transcript)
+        except Exception as e:
+            print(f"Transcript digest unavailable: {str(e)}")
+
+    prompt = create_quiz_prompt(user_prompt, transcript, last_quiz, quiz_type=quiz_type, difficulty=difficulty,
+                                digest=digest)
+    return prompt, None
+
+def save_generated_quiz(lecture_id, user_id, quiz_content, user_prompt, quiz_type, difficulty):
+    """
+    Stores a newly generated quiz as the current version for the lecture.
+    
+    Returns:
+        dict: The stored quiz document
+    """
+    # Create a quiz document
+    quiz_id = str(uuid.uuid4())
+    version_id = str(uuid.uuid4())
+    quiz_document = {
+        "id": quiz_id,
+        "version_id": version_id,
+        "quiz_content": quiz_content,
+        "user_prompt": user_prompt,
+        "userId": user_id,
+        "created_at": datetime.now().isoformat(),
+        "lecture_id": lecture_id,
+        "is_current": True,
+        "editable": True,
+        "quiz_type": quiz_type,
+        "difficulty": difficulty
+    }
+    
+    # Save to database
+    from app import mongo
+    quizzes_col = mongo.db.quizzes
+    
+    # Check if we need to update existing quiz
+    existing_quiz = quizzes_col.find_one({"lecture_id": lecture_id, "userId": user_id})
+    if existing_quiz:
+        # Set all existing versions to non-current
+        quizzes_col.update_many(
+            {"lecture_id": lecture_id, "userId": user_id},
+            {"$set": {"is_current": False}}
+        )
+        
+        # Update quiz_id to match existing record
+        quiz_document["id"] = existing_quiz["id"]
+    
+    # Insert the new version
+    quizzes_col.insert_one(quiz_document)
+    
+    return quiz_document
+
+
+def generate_and_save_quiz(data, user_id, prompt):
+    """
+    Generates a quiz from a prepared prompt, stores it and returns the response body.
+    """
+    quiz_type = data.get("quiz_type", "standard")
+    difficulty = data.get("difficulty", "medium")
+
+    # Generate the quiz
+    response = llm.generate(prompt)
+    quiz_content = response.text
+    
+    quiz_document = save_generated_quiz(lecture_id=data.get("lecture_id"), user_id=user_id,
+                                        quiz_content=quiz_content, user_prompt=data.get("user_prompt"),
+                                        quiz_type=quiz_type, difficulty=difficulty)
+    
+    return {
+        "status": "success",
+        "quiz_id": quiz_document["id"],
+        "version_id": quiz_document["version_id"],
+        "quiz_content": quiz_content,
+        "timestamp": datetime.now().isoformat(),
+        "quiz_type": quiz_type,
+        "difficulty": difficulty
+    }
+
+def quiz_request_key(data, user_id):
+    """
+    Identifies identical quiz requests (same lecture, prompt and parameters) so duplicates share one generation.
+    """
+    return generation_jobs.request_key("quiz", user_id, data)
+
+def run_quiz_job(data, user_id, report):
+    """
+    Background job body for /generate/async.
+    """
+    report("preparing_prompt", 10)
+    prompt, _ = prepare_quiz_prompt(data, user_id)
+    report("generating", 30)
+    return generation_jobs.coalesce(quiz_request_key(data, user_id), generate_and_save_quiz, data, user_id, prompt)
+
+
 @quiz_route.route("/generate", methods=["POST"])
 @jwt_required()
 def generate_quiz():
@@ -128,72 +233,13 @@ def generate_quiz():
         user_id = current_user.get('userId') or current_user.get('id') or current_user.get('email')
         
         data = request.get_json()
-        user_prompt = data.get("user_prompt")
-        transcript = data.get("transcript")
-        last_quiz = data.get("last_notes")  # Matches frontend naming
-        lecture_id = data.get("lecture_id")
-        
-        # Validate required fields
-        if not user_prompt:
-            return jsonify({
-                "error": "Missing required fields",
-                "message": "User prompt is required"
-            }), 400
-        
-        # Add new parameters
-        quiz_type = data.get("quiz_type", "standard")
-        difficulty = data.get("difficulty", "medium")
-
-        # Generate the quiz
-        prompt = create_quiz_prompt(user_prompt, transcript, last_quiz, quiz_type=quiz_type, difficulty=difficulty)
-        response = model.generate_content(prompt)
-        quiz_content = response.text
-        
-        # Create a quiz document
-        quiz_id = str(uuid.uuid4())
-        version_id = str(uuid.uuid4())
-        quiz_document = {
-            "id": quiz_id,
-            "version_id": version_id,
-            "quiz_content": quiz_content,
-            "user_prompt": user_prompt,
-            "userId": user_id,
-            "created_at": datetime.now().isoformat(),
-            "lecture_id": lecture_id,
-            "is_current": True,
-            "editable": True,
-            "quiz_type": quiz_type,
-            "difficulty": difficulty
-        }
-        
-        # Save to database
-        from app import mongo
-        quizzes_col = mongo.db.quizzes
-        
-        # Check if we need to update existing quiz
-        existing_quiz = quizzes_col.find_one({"lecture_id": lecture_id, "userId": user_id})
-        if existing_quiz:
-            # Set all existing versions to non-current
-            quizzes_col.update_many(
-                {"lecture_id": lecture_id, "userId": user_id},
-                {"$set": {"is_current": False}}
-            )
-            
-            # Update quiz_id to match existing record
-            quiz_document["id"] = existing_quiz["id"]
+        prompt, error = prepare_quiz_prompt(data, user_id)
+        if error:
+            return error
         
-        # Insert the new version
-        quizzes_col.insert_one(quiz_document)
-        
-        return jsonify({
-            "status": "success",
-            "quiz_id": quiz_document["id"],
-            "version_id": version_id,
-            "quiz_content": quiz_content,
-            "timestamp": datetime.now().isoformat(),
-            "quiz_type": quiz_type,
-            "difficulty": difficulty
-        }), 200
+        # A double-click or a second tab attaches to the generation already in flight
+        result = generation_jobs.coalesce(quiz_request_key(data, user_id), generate_and_save_quiz, data, user_id, prompt)
+        return jsonify(result), 200
         
     except Exception as e:
         import traceback
@@ -203,6 +249,83 @@ def generate_quiz():
             "traceback": traceback.format_exc()
         }), 500
 
+@quiz_route.route("/generate/async", methods=["POST"])
+@jwt_required()
+def generate_quiz_async():
+    """
+    Queue quiz generation in the background; poll /jobs/<job_id> for the result.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('id') or current_user.get('email')
+    
+    data = request.get_json()
+    if not data.get("user_prompt"):
+        return jsonify({
+            "error": "Missing required fields",
+            "message": "User prompt is required"
+        }), 400
+    
+    try:
+        job_id = generation_jobs.submit("quiz", user_id, run_quiz_job, data, user_id,
+                                        key=quiz_request_key(data, user_id))
+    except generation_jobs.TooManyJobsError as e:
+        return jsonify({"error": "Too many generation jobs", "message": str(e)}), 429
+    
+    return jsonify({"status": "queued", "job_id": job_id}), 202
+
+@quiz_route.route("/generate/stream", methods=["POST"])
+@jwt_required()
+def generate_quiz_stream():
+    """
+    Generate a quiz like /generate, streaming the text as Server-Sent Events while Gemini writes it.
+    The quiz is saved once the stream completes; nothing is saved if the client disconnects.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('id') or current_user.get('email')
+    
+    data = request.get_json()
+    prompt, error = prepare_quiz_prompt(data, user_id)
+    if error:
+        return error
+    quiz_type = data.get("quiz_type", "standard")
+    difficulty = data.get("difficulty", "medium")
+    
+    def event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+    
+    def generate():
+        pieces = None
+        try:
+            pieces = llm.generate_stream(prompt)
+            parts = []
+            for piece in pieces:
+                parts.append(piece)
+                yield event("delta", {"text": piece})
+            
+            quiz_document = save_generated_quiz(lecture_id=data.get("lecture_id"), user_id=user_id,
+                                                quiz_content="".join(parts), user_prompt=data.get("user_prompt"),
+                                                quiz_type=quiz_type, difficulty=difficulty)
+            yield event("complete", {
+                "status": "success",
+                "quiz_id": quiz_document["id"],
+                "version_id": quiz_document["version_id"],
+                "timestamp": datetime.now().isoformat(),
+                "quiz_type": quiz_type,
+                "difficulty": difficulty
+            })
+        except Exception as e:
+            yield event("error", {"error": "Quiz generation failed", "message": str(e)})
+        finally:
+            # Stops reading from Gemini when the client disconnects mid-stream
+            if pieces is not None:
+                pieces.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @quiz_route.route("/get/<lecture_id>", methods=["GET"])
 @jwt_required()
 def get_quiz(lecture_id):
@@ -471,35 +594,15 @@ def translate_quiz_with_gemini(content, target_language):
         str: Translated quiz content
     """
     try:
-        # For very large content, we need to split it
-        if len(content) > 30000:
-            chunks = [content[i:i+30000] for i in range(0, len(content), 30000)]
-            translated_chunks = []
-            
-            for chunk in chunks:
-                prompt = f"""
-                Translate the following quiz content to {target_language}. 
-                Preserve all formatting, including markdown syntax, quiz structure, options, and correct answers.
-                Make sure all multiple-choice options are correctly labeled and maintain the same meaning.
-                
-                QUIZ TO TRANSLATE:
-                {chunk}
-                """
-                response = model.generate_content(prompt, generation_config={"temperature": 0.1})
-                translated_chunks.append(response.text)
-            
-            return ''.join(translated_chunks)
-        else:
-            prompt = f"""
-            Translate the following quiz content to {target_language}.
-            Preserve all formatting, including markdown syntax, quiz structure, options, and correct answers.
-            Make sure all multiple-choice options are correctly labeled and maintain the same meaning.
-            
-            QUIZ TO TRANSLATE:
-            {content}
-            """
-            response = model.generate_content(prompt, generation_config={"temperature": 0.1})
-            return response.text
+        # Split on markdown blocks and translate the pieces concurrently, in order
+        return translation.translate(
+            content,
+            target_language,
+            instructions="""Preserve all formatting, including markdown syntax, quiz structure, options, and correct answers.
+        Make sure all multiple-choice options are correctly labeled and maintain the same meaning.""",
+            markdown=True,
+            generation_config={"temperature": 0.1}
+        )
     except Exception as e:
         print(f"Quiz translation error: {str(e)}")
         return content
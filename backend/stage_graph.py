@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Stage:
+    """
+    One step of a processing pipeline.
+
+    Args:
+        name (str): Stage name, also used as the key of its result
+        fn (callable): Called as fn(results) with the results of finished stages; returns this stage's result
+        after (tuple): Names of the stages that must finish first
+        progress (int): Overall progress to report when the stage starts
+    """
+
+    def __init__(self, name, fn, after=(), progress=None):
+        self.name = name
+        self.fn = fn
+        self.after = tuple(after)
+        self.progress = progress
+
+
+def run_stages(stages, on_start=None, on_finish=None):
+    """
+    Runs stages concurrently, each as soon as the stages it depends on have finished.
+
+    If a stage fails, no further stages are started; the ones already running are allowed to
+    finish and the first error is raised.
+
+    Args:
+        stages (list): Stage objects
+        on_start (callable): Called as on_start(stage) before a stage runs
+        on_finish (callable): Called as on_finish(stage, timing) after a stage finishes or fails;
+            timing has started_at, finished_at, seconds and, on failure, error
+
+    Returns:
+        tuple: (results, timings) dicts keyed by stage name
+    """
+    names = {stage.name for stage in stages}
+    for stage in stages:
+        unknown = [name for name in stage.after if name not in names]
+        if unknown:
+            raise ValueError(f"Stage {stage.name} depends on unknown stages: {unknown}")
+
+    results, timings = {}, {}
+    waiting = list(stages)
+    running = {}
+    error = None
+
+    with ThreadPoolExecutor(max_workers=len(stages) or 1, thread_name_prefix="stage") as executor:
+        while True:
+            if error is None:
+                ready = [stage for stage in waiting if all(name in results for name in stage.after)]
+                for stage in ready:
+                    waiting.remove(stage)
+                    if on_start:
+                        on_start(stage)
+                    timings[stage.name] = {"started_at": time.time()}
+                    running[executor.submit(stage.fn, results)] = stage
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                timing = timings[stage.name]
+                timing["finished_at"] = time.time()
+                timing["seconds"] = round(timing["finished_at"] - timing["started_at"], 3)
+                try:
+                    results[stage.name] = future.result()
+                except Exception as e:
+                    timing["error"] = str(e)
+                    error = error or e
+                if on_finish:
+                    on_finish(stage, timing)
+
+    if error is not None:
+        raise error
+    if waiting:
+        raise ValueError(f"Stages never became ready: {[stage.name for stage in waiting]}")
+    return results, timings
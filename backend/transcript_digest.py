@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from pymongo import MongoClient
+import llm
+
+load_dotenv()
+
+# Sections are summarized concurrently; llm applies the Gemini rate limit
+DIGEST_SECTION_CHARS = int(os.getenv("DIGEST_SECTION_CHARS", 8000))
+DIGEST_CONCURRENCY = int(os.getenv("DIGEST_CONCURRENCY", 4))
+
+JSON_CONFIG = {"temperature": 0.2, "response_mime_type": "application/json"}
+
+mongo_uri = os.getenv("MONGO_URI")
+mongo_client = MongoClient(mongo_uri)
+db = mongo_client.get_default_database()
+digests_collection = db.transcript_digests
+transcripts_collection = db.transcripts
+
+
+def transcript_hash(text):
+    """
+    Identifies the transcript text a digest was built from.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _parse_json(text, default):
+    """
+    Parses a JSON reply, tolerating a surrounding markdown code fence.
+    """
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        return json.loads(text)
+    except ValueError:
+        return default
+
+
+def split_sections(segments):
+    """
+    Groups timestamped segments into sections of about DIGEST_SECTION_CHARS characters.
+
+    Args:
+        segments (list): Dicts with text, start and end; start/end may be None for plain text
+
+    Returns:
+        list: Dicts with text, start and end for each section
+    """
+    sections = []
+    current = None
+    for segment in segments:
+        if current is None or len(current["text"]) + len(segment["text"]) > DIGEST_SECTION_CHARS:
+            current = {"text": "", "start": segment.get("start"), "end": segment.get("end")}
+            sections.append(current)
+        current["text"] += segment["text"].strip() + "\n"
+        current["end"] = segment.get("end")
+    return sections
+
+
+def summarize_section(section):
+    """
+    Summarizes one section into a title, a short summary and its key points.
+    """
+    prompt = f"""
+    Summarize this part of a lecture transcript.
+    Return ONLY a JSON object with these fields:
+    - title: A short heading for this part of the lecture
+    - summary: 3-5 sentences covering what is taught
+    - key_points: List of key facts, definitions, formulas and examples
+
+    Transcript:
+    {section["text"]}
+    """
+    response = llm.generate(prompt, generation_config=JSON_CONFIG, cache=True)
+    outline = _parse_json(response.text, {})
+    return {
+        "title": outline.get("title", "Untitled section"),
+        "summary": outline.get("summary", ""),
+        "key_points": outline.get("key_points", []),
+        "start": section["start"],
+        "end": section["end"],
+    }
+
+
+def summarize_lecture(outline):
+    """
+    Builds lecture metadata and an overall summary from the section outline.
+    """
+    sections = "\n\n".join(
+        f"{index + 1}. {section['title']}\n{section['summary']}" for index, section in enumerate(outline)
+    )
+    prompt = f"""
+    These are summaries of consecutive sections of one lecture.
+    Return ONLY a JSON object with these fields:
+    - subject: The academic subject or discipline
+    - level: Academic level (introductory, intermediate, advanced)
+    - main_topics: List of 3-5 main topics covered
+    - speaker: Name of lecturer if mentioned
+    - summary: A comprehensive summary of the whole lecture preserving key concepts,
+      definitions, examples and conclusions
+
+    Sections:
+    {sections}
+    """
+    response = llm.generate(prompt, generation_config=JSON_CONFIG, cache=True)
+    return _parse_json(response.text, {})
+
+
+def build_digest(segments):
+    """
+    Computes the metadata, hierarchical summary and section outline of a transcript.
+
+    Args:
+        segments (list): Transcript segments with text and optional start/end times
+
+    Returns:
+        dict: metadata, summary and outline
+    """
+    sections = split_sections(segments)
+    with ThreadPoolExecutor(max_workers=DIGEST_CONCURRENCY) as executor:
+        outline = list(executor.map(summarize_section, sections))
+    lecture = summarize_lecture(outline) if outline else {}
+    return {
+        "metadata": {
+            "subject": lecture.get("subject", "Not specified"),
+            "level": lecture.get("level", "Not specified"),
+            "main_topics": lecture.get("main_topics", []),
+            "speaker": lecture.get("speaker", "Not specified"),
+        },
+        "summary": lecture.get("summary", ""),
+        "outline": outline,
+    }
+
+
+def compute_digest(lecture_id, user_id, segments, plain_transcript):
+    """
+    Builds and stores the digest of a lecture's transcript.
+    """
+    print(f"Building transcript digest for lecture {lecture_id}...")
+    digest = build_digest(segments)
+    digest.update({
+        "lecture_id": lecture_id,
+        "user_id": user_id,
+        "transcript_hash": transcript_hash(plain_transcript),
+        "created_at": time.time(),
+    })
+    digests_collection.replace_one({"lecture_id": lecture_id, "user_id": user_id}, digest, upsert=True)
+    digest.pop("_id", None)
+    return digest
+
+
+def load_transcript(lecture_id, user_id):
+    """
+    Returns the stored plain transcript of a lecture, or None.
+    """
+    record = transcripts_collection.find_one(
+        {"lecture_id": lecture_id, "user_id": user_id}, {"plain_transcript": 1}
+    )
+    return record.get("plain_transcript") if record else None
+
+
+def _plain_segments(text):
+    return [{"text": line, "start": None, "end": None} for line in text.splitlines() if line.strip()]
+
+
+def get_digest(lecture_id, user_id, transcript=None):
+    """
+    Loads a lecture's digest, building it from the stored transcript if it is missing or stale.
+
+    The stored transcript is the source of truth: a transcript that differs from it is digested
+    without being stored, so text sent by a client never replaces the lecture's digest.
+
+    Args:
+        lecture_id (str): ID of the lecture
+        user_id (str): ID of the user
+        transcript (str, optional): Transcript the caller is working from; defaults to the stored one
+
+    Returns:
+        dict: The digest, or None if there is no transcript to digest
+    """
+    stored = load_transcript(lecture_id, user_id)
+    if transcript is None:
+        transcript = stored
+    if not transcript:
+        return None
+    if transcript != stored:
+        return build_digest(_plain_segments(transcript))
+
+    digest = digests_collection.find_one({"lecture_id": lecture_id, "user_id": user_id}, {"_id": 0})
+    if digest and digest.get("transcript_hash") == transcript_hash(transcript):
+        return digest
+
+    return compute_digest(lecture_id, user_id, _plain_segments(transcript), transcript)
+
+
+def digest_text(digest):
+    """
+    Renders a digest as condensed lecture content for a generation prompt.
+    """
+    lines = [digest.get("summary", ""), ""]
+    for section in digest.get("outline", []):
+        lines.append(f"## {section['title']}")
+        lines.append(section["summary"])
+        lines.extend(f"- {point}" for point in section.get("key_points", []))
+        lines.append("")
+    return "\n".join(lines).strip()
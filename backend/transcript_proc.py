@@ -1,24 +1,15 @@
-from flask import Blueprint, request, jsonify, Response, send_file
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
-import cv2
-import ast
-import torch
 import json
-import whisper
+import time
+import uuid
+import hashlib
 from collections import defaultdict
-from inference_sdk import InferenceHTTPClient
-from torchvision import transforms
+from concurrent.futures import Future, as_completed
 from dotenv import load_dotenv
 import multiprocessing
 from flask_cors import CORS
-from pydub import AudioSegment
-from pydub.utils import make_chunks
-from moviepy.editor import VideoFileClip
-from concurrent.futures import ProcessPoolExecutor
-import google.generativeai as genai
-from google.generativeai.types import RequestOptions
-from google.api_core import retry
 from pymongo import MongoClient
 from bson.json_util import dumps
 from bson.objectid import ObjectId
@@ -28,6 +19,20 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 import tempfile
 from bson.json_util import dumps
+import whisper_pool
+from audio_stream import extract_pcm, open_pcm, segment_pcm, keep_segments, stitch_segments
+import artifact_cache
+import job_queue
+import generation_jobs
+import translation
+import llm
+import transcript_digest
+import hand_raise
+from stage_graph import Stage, run_stages
+import question_analysis
+import question_detector
+import frame_sampler
+import frame_index as frame_index_store
 
 
 # Ensure multiprocessing compatibility
@@ -50,104 +55,108 @@ transcripts_collection = db.transcripts
 results_collection = db.results
 processing_status_collection = db.processing_status
 translations_collection = db.translations  # New collection for storing translations
-
-# Initialize Roboflow client
-robo_key = os.getenv("ROBOFLOW_KEY")
-
-CLIENT = InferenceHTTPClient(
-    api_url="https://detect.roboflow.com",
-    api_key=robo_key
-)
+upload_sessions_collection = db.upload_sessions
+lectures_collection = db.lectures
 
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 PROCESSED_FOLDER = 'processed'
 
+# Chunked upload limits (bytes)
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_UPLOAD_CHUNK_SIZE = 256 * 1024
+MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+
 # Ensure upload and processed folders exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(PROCESSED_FOLDER, exist_ok=True)
 
-# Define transformations if required by the model
-transform = transforms.Compose([
-    transforms.ToTensor(),
-])
-
-# Configure Gemini API
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=gemini_api_key)
-
-gemini_model = genai.GenerativeModel("gemini-1.5-flash")
-
 # Supported languages
 SUPPORTED_LANGUAGES = ["english", "hindi", "telugu"]
 
-def extract_audio(video_path, audio_path="output_audio.mp3"):
-    """
-    Extracts audio from a video file and saves it as an MP3 file.
-    """
-    print(f"Extracting audio from {video_path}...")
-    clip = VideoFileClip(video_path)
-    clip.audio.write_audiofile(audio_path)
-    clip.close()
-    print(f"Audio saved to {audio_path}")
-    return audio_path
-
-
-def split_audio(audio_path, output_dir="chunks", chunk_duration=600):
+def transcribe_chunk_with_timestamps(chunk, result):
     """
-    Splits the audio file into smaller chunks of a specified duration.
+    Converts a Whisper result for an audio chunk into lecture-relative segments.
     """
-    print(f"Splitting audio into chunks of {chunk_duration} seconds...")
-    os.makedirs(output_dir, exist_ok=True)
-
-    print(f"File exists: {os.path.exists(audio_path)}")
-    audio = AudioSegment.from_file(audio_path)
-    chunks = make_chunks(audio, chunk_duration * 1000)  # chunk_duration in milliseconds
-
-    chunk_paths = []
-    for i, chunk in enumerate(chunks):
-        chunk_path = os.path.join(output_dir, f"chunk_{i}.mp3")
-        chunk.export(chunk_path, format="mp3")
-        chunk_paths.append(chunk_path)
-
-    print(f"Audio split into {len(chunk_paths)} chunks.")
-    return chunk_paths
-
-
-def transcribe_chunk_with_timestamps(chunk_path, model_name="base"):
-    """
-    Transcribes an audio chunk using Whisper model with timestamps.
-    """
-    print(f"Transcribing {chunk_path}...")
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    model = whisper.load_model(model_name).to(device)
-    result = model.transcribe(chunk_path)
-    chunk_number = int(chunk_path.rsplit('_', 1)[-1].rsplit('.',1)[0])
-    print(f"Chunk number {chunk_number}")
+    print(f"Chunk number {chunk['index']}")
 
     segments = []
     for segment in result['segments']:
         segments.append({
-            "start": (chunk_number*600)+segment['start'],
-            "end": (chunk_number*600)+segment['end'],
+            "start": chunk['offset']+segment['start'],
+            "end": chunk['offset']+segment['end'],
             "text": segment['text']
         })
 
-    print(f"Completed transcription for {chunk_path}")
+    print(f"Completed transcription for chunk {chunk['index']} in {result['latency']:.2f}s")
     return segments
 
 
-def transcribe_audio_chunks_with_timestamps(chunk_paths, model="base", use_gpu=False):
+def transcribe_audio_chunks_with_timestamps(pcm_path, chunks, lecture_id, user_id):
     """
-    Transcribes multiple audio chunks with timestamps using parallel processing.
+    Transcribes PCM audio chunks on the resident Whisper pool, persisting each chunk as it completes.
     """
     print("Starting transcription of audio chunks with timestamps...")
-    transcripts = []
-    with ProcessPoolExecutor(max_workers=4) as executor:
-        futures = [executor.submit(transcribe_chunk_with_timestamps, chunk, model_name=model) for chunk in chunk_paths]
-        for future in futures:
-            transcripts.extend(future.result())
-    return transcripts
+    transcripts_collection.update_one(
+        {"lecture_id": lecture_id, "user_id": user_id},
+        {"$set": {
+            "lecture_id": lecture_id,
+            "user_id": user_id,
+            "partial_segments": [],
+            "transcription_status": "transcribing",
+            "chunks_total": len(chunks),
+            "chunks_done": 0
+        }},
+        upsert=True
+    )
+
+    samples = open_pcm(pcm_path)
+    futures = {}
+    for position, chunk in enumerate(chunks):
+        # Chunks whose audio was transcribed before are served from the artifact cache
+        chunk['cache_key'] = artifact_cache.chunk_key(
+            samples[chunk['start_sample']:chunk['end_sample']], whisper_pool.WHISPER_MODEL
+        )
+        cached = artifact_cache.get_chunk_segments(chunk['cache_key'])
+        if cached is not None:
+            future = Future()
+            future.set_result({"segments": cached, "latency": 0.0, "cached": True})
+        else:
+            future = whisper_pool.submit(pcm_path, chunk['start_sample'], chunk['end_sample'])
+        futures[future] = position
+
+    # Chunks finish in any order, but clients read partial_segments as an append-only, time-ordered
+    # list; a chunk is published once every chunk before it has been
+    order = sorted(range(len(chunks)), key=lambda position: chunks[position]['start_sample'])
+    published = 0
+    finished = {}
+    chunk_segments = []
+    for done, future in enumerate(as_completed(futures), start=1):
+        position = futures[future]
+        chunk = chunks[position]
+        result = future.result()
+        if not result.get("cached"):
+            artifact_cache.put_chunk_segments(chunk['cache_key'], result['segments'])
+        segments = transcribe_chunk_with_timestamps(chunk, result)
+        chunk_segments.append((chunk, segments))
+
+        finished[position] = keep_segments(chunk, segments)
+        ready = []
+        while published < len(order) and order[published] in finished:
+            ready.extend(finished.pop(order[published]))
+            published += 1
+        transcripts_collection.update_one(
+            {"lecture_id": lecture_id, "user_id": user_id},
+            {
+                "$push": {"partial_segments": {"$each": ready}},
+                "$set": {"chunks_done": done}
+            }
+        )
+        processing_status_collection.update_one(
+            {"lecture_id": lecture_id, "user_id": user_id},
+            {"$set": {"progress": 30 + int(30 * done / len(chunks)), "chunks_done": done, "chunks_total": len(chunks)}}
+        )
+    return stitch_segments(chunk_segments)
 
 
 def save_transcripts_with_timestamps(transcripts, lecture_id, user_id):
@@ -174,7 +183,8 @@ def save_transcripts_with_timestamps(transcripts, lecture_id, user_id):
             "lecture_id": lecture_id,
             "user_id": user_id,
             "json_transcript": json_transcript,
-            "plain_transcript": plain_transcript
+            "plain_transcript": plain_transcript,
+            "transcription_status": "completed"
             }
         },
         upsert=True
@@ -229,134 +239,155 @@ def stream_transcripts(lecture_id, user_id, language="english"):
     return Response(generate(), content_type="text/plain")
 
 
+def stream_transcript_events(lecture_id, user_id, poll_interval=1.0):
+    """
+    Streams transcript segments as Server-Sent Events while transcription is still running.
+    """
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        sent = 0
+        while True:
+            record = transcripts_collection.find_one(
+                {"lecture_id": lecture_id, "user_id": user_id},
+                {"_id": 0, "partial_segments": {"$slice": [sent, 1000]},
+                 "transcription_status": 1, "chunks_done": 1, "chunks_total": 1}
+            )
+            status = processing_status_collection.find_one({"lecture_id": lecture_id, "user_id": user_id}) or {}
+
+            if record and "partial_segments" in record:
+                segments = record.get("partial_segments", [])
+            elif record and sent == 0:
+                # Transcribed before incremental persistence existed
+                full = transcripts_collection.find_one(
+                    {"lecture_id": lecture_id, "user_id": user_id}, {"_id": 0, "json_transcript": 1}
+                )
+                segments = full.get("json_transcript", [])
+            else:
+                segments = []
+
+            if segments:
+                sent += len(segments)
+                yield event("segments", {
+                    "segments": segments,
+                    "chunks_done": record.get("chunks_done"),
+                    "chunks_total": record.get("chunks_total")
+                })
+                continue
+
+            if record and record.get("transcription_status", "completed") == "completed":
+                yield event("complete", {"segments_sent": sent})
+                return
+            if status.get("status") == "error":
+                yield event("error", {"error": status.get("error", "Processing failed")})
+                return
+            if not record and not status:
+                yield event("error", {"error": "Transcript not found"})
+                return
+
+            yield ": keep-alive\n\n"
+            time.sleep(poll_interval)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 def process_frame(frame):
     """
     Process a single frame for hand raise detection.
     """
-    input_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    print('Fetching results from API')
-    result = CLIENT.infer(input_frame, model_id="hand-raise-v1m/20")
-    print('Retrieved the results')
+    return hand_raise.get_client().count(frame)
 
-    hand_raised_count = 0
-    for boxes in result['predictions']:
-        if boxes['class_id'] == 0:
-            hand_raised_count += 1
 
-    return hand_raised_count
+def find_question_windows(lecture_id, user_id, content_hash=None):
+    """
+    Returns the questions asked in a lecture with their answer windows, cached per video.
+    """
+    artifact = artifact_cache.settings_name("questions", question_detector.settings())
+    quiz_locs = artifact_cache.get_json(content_hash, artifact)
+    if quiz_locs is None:
+        quiz_locs = analyze_transcript(lecture_id, user_id)
+        artifact_cache.put_json(content_hash, artifact, quiz_locs)
+    return quiz_locs
 
 
-def process_video(video_path, lecture_id, user_id):
+def process_video(video_path, lecture_id, user_id, content_hash=None, quiz_locs=None, video_index=None):
     """
     Processes the video to detect raised hands and analyze question responses.
     """
     print('Processing video...')
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise Exception(f"Failed to open video file: {video_path}")
-    
     total_students = 40    
-    # Get video properties
-    fps = cap.get(cv2.CAP_PROP_FPS)  # Frames per second
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
 
     # Initialize result dictionaries
     question_results = defaultdict(lambda: {'yes': 0, 'no': 0, 'not_answered': total_students})
     questions_for_revision = []
     questions_completed = []
 
-    quiz_locs = analyze_transcript(lecture_id, user_id)
+    if quiz_locs is None:
+        quiz_locs = find_question_windows(lecture_id, user_id, content_hash)
 
-    # Process each question and timestamp range
+    # Collect every question window so each sampling round decodes the video in a single forward pass
+    questions, windows = [], []
     for question_data in quiz_locs["questions"]:
         for question, (start_time, end_time) in question_data.items():
-            start_frame = int(fps * start_time)
-            end_frame = int(fps * end_time)
-
-            yes_count, no_count = 0, 0
-
-            for frame_index in range(start_frame, end_frame + 1):
-                if 0 <= frame_index < total_frames:
-                    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-                    ret, frame = cap.read()
-                    if not ret:
-                        break
-
-                    # Process frame to detect hand raises
-                    hand_raised_count = process_frame(frame)
-                    yes_count += hand_raised_count
-                    no_count += total_students - hand_raised_count
-
-            # Adjust not_answered based on detected responses
-            not_answered = max(0, total_students - yes_count - no_count)
-            question_results[question] = {
-                "yes": yes_count,
-                "no": no_count,
-                "not_answered": not_answered
-            }
-
-            # Determine correct answer using Gemini
-            correct_ans_res = gemini_model.generate_content([str(question), """Give me 1 word answer whether the correct answer to this question
-             is either yes or no. Do not return anything else, just that single word.
-
-                Example,
-                    'Is capital of Italy Rome?'
-
-                    Return: yes (one word yes or no)
-
-                    Return: str 
-
-             """], request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)))
-            correct_ans = str(correct_ans_res.text)
-
-            # Categorize question
-            if correct_ans.lower() == "yes":
-                if yes_count / total_students >= 0.7:  # Example threshold for completion
-                    questions_completed.append(question)
-                else:
-                    questions_for_revision.append(question)
-            else:
-                if no_count / total_students >= 0.7:  # Example threshold for completion
-                    questions_completed.append(question)
-                else:
-                    questions_for_revision.append(question)
-
-    cap.release()
-    
-    # Get topics for completed questions
-    if questions_completed:
-        res_ques_complete = gemini_model.generate_content([str(questions_completed), """Give me the 2, 3 or 4 topics relating to each question in a list format
-                For example, 
-                    ['Does supervised learning have ouput labels?', 'Is capital of Greece Aethens?']
-
-                    Should return: ['Machine Learning', 'Artificial Intelligence', 'General Knowledge', 'Geography']
-
-                    Just give a list and do not print anything else. Donot take example for their factual accuracy, but just for formatting.
-                Return: List(str)
-
-            """], request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)))
-        topics_completed = res_ques_complete.text
-        topics_completed = ast.literal_eval(topics_completed.strip())
-    else:
-        topics_completed = []
-    
-    # Get topics for revision questions
-    if questions_for_revision:
-        res_ques_revision = gemini_model.generate_content([str(questions_for_revision), """Give me the 3 or 4 topics relating to the question in a list format
-                For example, 
-                    ['Does supervised learning have ouput labels?', 'Is capital of Greece Aethens?']
-
-                    Should return: ['Machine Learning', 'Artificial Intelligence', 'General Knowledge', 'Geography']
+            windows.append((len(questions), start_time, end_time))
+            questions.append(question)
+
+    # Seed the detection cache with per-frame counts from earlier runs on the same video with the
+    # same detector; deduplicated counts also depend on the sampling rates
+    video_key = content_hash or video_path
+    client = hand_raise.get_client()
+    detections_artifact = artifact_cache.settings_name(
+        "detections", client.settings(), frame_sampler.SAMPLE_FPS, frame_sampler.MAX_SAMPLE_FPS
+    )
+    detections = artifact_cache.get_json(content_hash, detections_artifact) or {}
+    client.prime(video_key, {int(frame_index): count for frame_index, count in detections.items()})
+
+    def count_frames(frames, step, lookahead):
+        for frame_index, keys, hand_raised_count in client.count_frames(video_key, frames, max_gap=step,
+                                                                         lookahead=lookahead):
+            detections[str(frame_index)] = hand_raised_count
+            yield frame_index, keys, hand_raised_count
+
+    # Each window is sampled coarsely, densified where the count changes and reduced to its peak
+    # (or median) count, so the tallies are numbers of students rather than sums over frames
+    raised_hands, frames_sampled = frame_sampler.count_windows(video_path, windows, count_frames, index=video_index)
+    print(f"Sampled {frames_sampled} frames for {len(windows)} question windows")
+
+    artifact_cache.put_json(content_hash, detections_artifact, detections)
+
+    # Correct answers and topic tags for every question come from one batched call
+    classifications = question_analysis.classify_questions([str(question) for question in questions])
+    completed, for_revision = [], []
+
+    # Tally the responses for each question
+    for key, question in enumerate(questions):
+        yes_count = min(total_students, raised_hands.get(key, 0))
+        no_count = total_students - yes_count
+
+        # Adjust not_answered based on detected responses
+        not_answered = max(0, total_students - yes_count - no_count)
+        question_results[question] = {
+            "yes": yes_count,
+            "no": no_count,
+            "not_answered": not_answered
+        }
 
-                    Just give a list and do not print anything else. Donot take example for their factual accuracy, but just for formatting.
+        # Categorize question
+        correct_count = yes_count if classifications[key]["answer"] == "yes" else no_count
+        if correct_count / total_students >= 0.7:  # Example threshold for completion
+            questions_completed.append(question)
+            completed.append(classifications[key])
+        else:
+            questions_for_revision.append(question)
+            for_revision.append(classifications[key])
 
-                    Return: List(str)
-            """], request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300)))
-        topics_for_revision = res_ques_revision.text
-        topics_for_revision = ast.literal_eval(topics_for_revision.strip())
-    else:
-        topics_for_revision = []
+    topics_completed = question_analysis.collect_topics(completed)
+    topics_for_revision = question_analysis.collect_topics(for_revision)
 
     # Save processing results in MongoDB
     results_collection.update_one(
@@ -378,34 +409,15 @@ def process_video(video_path, lecture_id, user_id):
     print('Video processing completed.')
     return True
 
-def translate_text(text, target_language):
+def translate_text(text, target_language, progress=None):
     """
-    Translates text to the specified language using Gemini.
+    Translates text to the specified language using Gemini, translating chunks concurrently.
     """
-    print(f"Translating text to {target_language}...")
-    
-    # For large texts, split into chunks to avoid exceeding Gemini's input limits
-    max_chunk_size = 10000  # Adjust based on Gemini's actual limits
-    chunks = [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
-    translated_chunks = []
-    
-    for chunk in chunks:
-        prompt = f"""Translate the following text to {target_language}:
-        
-        {chunk}
-        
-        Return only the translated text without any explanations or additional content.
-        """
-        
-        response = gemini_model.generate_content(
-            prompt,
-            request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300))
-        )
-        
-        translated_chunks.append(response.text.strip())
-    
-    # Combine all translated chunks
-    translated_text = "\n".join(translated_chunks)
+    translated_text = translation.translate(
+        text,
+        target_language,
+        progress=progress
+    )
     
     # Ensure proper encoding for Telugu
     if target_language.lower() == "telugu":
@@ -413,6 +425,22 @@ def translate_text(text, target_language):
     
     return translated_text
 
+def translation_progress(lecture_id, user_id):
+    """
+    Returns a progress callback that records translated chunks in the processing status.
+    """
+    def report(done, total):
+        processing_status_collection.update_one(
+            {"lecture_id": lecture_id, "user_id": user_id},
+            {"$set": {
+                "translation_progress": int(100 * done / total),
+                "translation_chunks_done": done,
+                "translation_chunks_total": total
+            }},
+            upsert=True
+        )
+    return report
+
 def create_pdf(text, title="Transcript"):
     """
     Creates a PDF document from the provided text.
@@ -492,56 +520,53 @@ def analyze_transcript(lecture_id, user_id):
     if not transcript_data:
         raise Exception(f"Transcript not found for lecture_id: {lecture_id} and user_id: {user_id}")
 
-    file_contents = transcript_data.get("json_transcript")
-
-    # Write transcript to temporary file for analysis
-    with open('temp_analyze_transcript.txt', "w") as f:
-        f.write(str(file_contents) + "\n")
-
-    temp_upload = genai.upload_file('temp_analyze_transcript.txt')
-    result = gemini_model.generate_content(
-        [temp_upload, "\n\n\n\n",r"""Analyze this transcript and give me the time stamp in JSON format, 
-        where questions are being asked.
-        Use this JSON schema:
-
+    # Shortlist question-like segments locally; only those are sent to Gemini for confirmation
+    return question_detector.detect_questions(transcript_data.get("json_transcript") or [])
 
-        QuestionTimestamps = Dict(str: List[Dict(str: List(int, int))])
 
-        Example:
-        QuestionTimestamps = \{'questions':  [\{'Is the 2+2=4?': [15.222, 17.222]\}, \{'Is the capital of France, Pairs?', [254.506, 258.990]\}\}
-
-        Return: QuestionTimestamps
-
-
-        (The first timestamp if for answering yes, and the second timestamp is for answering no).
+@video_processing_bp.route("/")
+def home():
+    return jsonify({"message": "Video Processing API is running"}), 200
 
-        """], request_options=RequestOptions(retry=retry.Retry(initial=10, multiplier=2, maximum=60, timeout=300))
+def queue_video_processing(video_path, lecture_id, user_id, preferred_language, priority, content_hash):
+    """
+    Records the processing status of a saved upload and queues it for the workers.
+    """
+    # Update processing status
+    processing_status_collection.update_one(
+        {"lecture_id": lecture_id, "user_id": user_id},
+        {"$set": {
+            "status": "processing",
+            "stage": "queued",
+            "progress": 0,
+            "preferred_language": preferred_language,
+            "content_hash": content_hash
+        }},
+        upsert=True
     )
     
-    # Parse result and convert to JSON
-    res_str = str(result.text)
-    if '\n' in res_str:
-        res_str = res_str.split('\n', 1)[1]
-    if res_str.endswith('```'):
-        res_str = res_str[:-4]
-    if res_str.startswith('```json'):
-        res_str = res_str[8:]
-    
-    # Clean up temporary file
-    os.remove('temp_analyze_transcript.txt')
-    
     try:
-        res_json = json.loads(res_str)
-        return res_json
-    except json.JSONDecodeError:
-        print(f"Failed to parse JSON: {res_str}")
-        # Return a default structure if parsing fails
-        return {"questions": []}
-
+        job_id = job_queue.enqueue(
+            "process_video",
+            (video_path, lecture_id, user_id, preferred_language, content_hash),
+            lecture_id,
+            user_id,
+            priority=priority
+        )
+    except job_queue.QueueFullError as e:
+        os.remove(video_path)
+        processing_status_collection.update_one(
+            {"lecture_id": lecture_id, "user_id": user_id},
+            {"$set": {"status": "error", "stage": "error", "error": str(e)}}
+        )
+        raise
+    
+    processing_status_collection.update_one(
+        {"lecture_id": lecture_id, "user_id": user_id},
+        {"$set": {"job_id": job_id}}
+    )
+    return job_id
 
-@video_processing_bp.route("/")
-def home():
-    return jsonify({"message": "Video Processing API is running"}), 200
 
 @video_processing_bp.route("/upload", methods=["POST"])
 @jwt_required()
@@ -565,40 +590,36 @@ def upload_video_general():
     preferred_language = request.form.get('language', 'english').lower()
     if preferred_language not in SUPPORTED_LANGUAGES:
         return jsonify({"error": f"Unsupported language. Supported options are: {', '.join(SUPPORTED_LANGUAGES)}"}), 400
+
+    # Get the queue priority (default to normal)
+    priority = request.form.get('priority', 'normal').lower()
+    if priority not in job_queue.PRIORITIES:
+        return jsonify({"error": f"Unsupported priority. Supported options are: {', '.join(job_queue.PRIORITIES)}"}), 400
+    
+    # Refuse the upload early if the processing queue is full
+    if not job_queue.has_capacity():
+        return jsonify({"error": "Processing queue is full. Please try again later."}), 503
     
     # Generate a new lecture ID
-    import uuid
     lecture_id = str(uuid.uuid4())
     
     video_filename = f"{lecture_id}.mp4"
     video_path = os.path.join(UPLOAD_FOLDER, video_filename)
     
-    # Save the uploaded file
-    video_file.save(video_path)
+    # Save the uploaded file, hashing it on the way to disk
+    content_hash = artifact_cache.save_and_hash(video_file.stream, video_path)
 
-    # Update processing status
-    processing_status_collection.update_one(
-        {"lecture_id": lecture_id, "user_id": user_id},
-        {"$set": {
-            "status": "processing",
-            "stage": "uploading",
-            "progress": 0,
-            "preferred_language": preferred_language
-        }},
-        upsert=True
-    )
-    
-    # Process the video in a separate process to avoid blocking
-    process = multiprocessing.Process(
-        target=process_video_and_transcript,
-        args=(video_path, lecture_id, user_id, preferred_language)
-    )
-    process.start()
+    # Queue the video for the processing workers
+    try:
+        job_id = queue_video_processing(video_path, lecture_id, user_id, preferred_language, priority, content_hash)
+    except job_queue.QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
     
     return jsonify({
-        "message": "Video upload successful. Processing started.",
+        "message": "Video upload successful. Processing queued.",
         "lecture_id": lecture_id,
-        "preferred_language": preferred_language
+        "preferred_language": preferred_language,
+        "job_id": job_id
     }), 202
 
 
@@ -624,97 +645,317 @@ def upload_video(lecture_id):
     preferred_language = request.form.get('language', 'english').lower()
     if preferred_language not in SUPPORTED_LANGUAGES:
         return jsonify({"error": f"Unsupported language. Supported options are: {', '.join(SUPPORTED_LANGUAGES)}"}), 400
+
+    # Get the queue priority (default to normal)
+    priority = request.form.get('priority', 'normal').lower()
+    if priority not in job_queue.PRIORITIES:
+        return jsonify({"error": f"Unsupported priority. Supported options are: {', '.join(job_queue.PRIORITIES)}"}), 400
+    
+    # Refuse the upload early if the processing queue is full
+    if not job_queue.has_capacity():
+        return jsonify({"error": "Processing queue is full. Please try again later."}), 503
     
     # Use the provided lecture_id from the URL
     video_filename = f"{lecture_id}.mp4"
     video_path = os.path.join(UPLOAD_FOLDER, video_filename)
     
-    # Save the uploaded file
-    video_file.save(video_path)
+    # Save the uploaded file, hashing it on the way to disk
+    content_hash = artifact_cache.save_and_hash(video_file.stream, video_path)
 
-    # Update processing status
-    processing_status_collection.update_one(
-        {"lecture_id": lecture_id, "user_id": user_id},
-        {"$set": {
-            "status": "processing",
-            "stage": "uploading",
-            "progress": 0,
-            "preferred_language": preferred_language
-        }},
-        upsert=True
+    # Queue the video for the processing workers
+    try:
+        job_id = queue_video_processing(video_path, lecture_id, user_id, preferred_language, priority, content_hash)
+    except job_queue.QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    
+    return jsonify({
+        "message": "Video upload successful. Processing queued.",
+        "lecture_id": lecture_id,
+        "preferred_language": preferred_language,
+        "job_id": job_id
+    }), 202
+
+@video_processing_bp.route("/uploads/init", methods=["POST"])
+@jwt_required()
+def init_chunked_upload():
+    """
+    Endpoint to start a resumable chunked upload. Returns the upload ID and chunk layout.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email') if isinstance(current_user, dict) else current_user
+    
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    
+    try:
+        size = int(data.get('size', 0))
+        chunk_size = int(data.get('chunk_size', DEFAULT_UPLOAD_CHUNK_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({"error": "size and chunk_size must be integers"}), 400
+    if size <= 0:
+        return jsonify({"error": "size must be a positive number of bytes"}), 400
+    if not MIN_UPLOAD_CHUNK_SIZE <= chunk_size <= MAX_UPLOAD_CHUNK_SIZE:
+        return jsonify({"error": f"chunk_size must be between {MIN_UPLOAD_CHUNK_SIZE} and {MAX_UPLOAD_CHUNK_SIZE} bytes"}), 400
+    
+    preferred_language = data.get('language', 'english').lower()
+    if preferred_language not in SUPPORTED_LANGUAGES:
+        return jsonify({"error": f"Unsupported language. Supported options are: {', '.join(SUPPORTED_LANGUAGES)}"}), 400
+    
+    priority = data.get('priority', 'normal').lower()
+    if priority not in job_queue.PRIORITIES:
+        return jsonify({"error": f"Unsupported priority. Supported options are: {', '.join(job_queue.PRIORITIES)}"}), 400
+    
+    # Upload into one of the user's lectures, or generate a new lecture ID. The ID becomes the
+    # video's file name at finalize, so only well-formed IDs of existing lectures are accepted
+    lecture_id = data.get('lecture_id')
+    if lecture_id:
+        try:
+            if str(uuid.UUID(str(lecture_id))) != lecture_id:
+                raise ValueError
+        except ValueError:
+            return jsonify({"error": "lecture_id must be a lecture UUID"}), 400
+        if not lectures_collection.find_one({"id": lecture_id, "userId": user_id}, {"_id": 1}):
+            return jsonify({"error": "Lecture not found"}), 404
+    else:
+        lecture_id = str(uuid.uuid4())
+    upload_id = str(uuid.uuid4())
+    part_path = os.path.join(UPLOAD_FOLDER, f"{upload_id}.part")
+    
+    # Reserve the full file so chunks can be written straight to their offsets
+    with open(part_path, "wb") as f:
+        f.truncate(size)
+    
+    total_chunks = (size + chunk_size - 1) // chunk_size
+    upload_sessions_collection.insert_one({
+        "upload_id": upload_id,
+        "lecture_id": lecture_id,
+        "user_id": user_id,
+        "size": size,
+        "chunk_size": chunk_size,
+        "total_chunks": total_chunks,
+        "received": [],
+        "preferred_language": preferred_language,
+        "priority": priority,
+        "status": "uploading",
+        "created_at": time.time()
+    })
+    
+    return jsonify({
+        "upload_id": upload_id,
+        "lecture_id": lecture_id,
+        "chunk_size": chunk_size,
+        "total_chunks": total_chunks
+    }), 201
+
+
+def get_upload_session(upload_id, user_id):
+    """
+    Looks up an upload session owned by the user.
+    """
+    return upload_sessions_collection.find_one({"upload_id": upload_id, "user_id": user_id}, {"_id": 0})
+
+
+@video_processing_bp.route("/uploads/<upload_id>/chunk", methods=["PUT"])
+@jwt_required()
+def put_upload_chunk(upload_id):
+    """
+    Endpoint to write one chunk at the given offset. The body is the raw chunk bytes and
+    the X-Chunk-SHA256 header must carry its hex digest.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email') if isinstance(current_user, dict) else current_user
+    
+    session = get_upload_session(upload_id, user_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    if session["status"] != "uploading":
+        return jsonify({"error": f"Upload is already {session['status']}"}), 409
+    
+    try:
+        offset = int(request.args.get('offset', -1))
+    except ValueError:
+        return jsonify({"error": "offset must be an integer"}), 400
+    if offset < 0 or offset >= session["size"] or offset % session["chunk_size"]:
+        return jsonify({"error": "offset must be a chunk boundary inside the file"}), 400
+    
+    expected_checksum = request.headers.get('X-Chunk-SHA256', '').lower()
+    if not expected_checksum:
+        return jsonify({"error": "X-Chunk-SHA256 header is required"}), 400
+    
+    chunk_index = offset // session["chunk_size"]
+    expected_length = min(session["chunk_size"], session["size"] - offset)
+    
+    # Stage the body in a spooled buffer and verify it before touching the part file, so a
+    # corrupt retry never overwrites a chunk that was already received intact
+    digest = hashlib.sha256()
+    written = 0
+    with tempfile.SpooledTemporaryFile(max_size=8 << 20) as buffer:
+        while written < expected_length:
+            block = request.stream.read(min(1 << 20, expected_length - written))
+            if not block:
+                break
+            digest.update(block)
+            buffer.write(block)
+            written += len(block)
+        
+        if written != expected_length or request.stream.read(1):
+            return jsonify({"error": f"Chunk {chunk_index} must be exactly {expected_length} bytes"}), 400
+        if digest.hexdigest() != expected_checksum:
+            return jsonify({"error": f"Checksum mismatch for chunk {chunk_index}"}), 422
+        
+        buffer.seek(0)
+        part_path = os.path.join(UPLOAD_FOLDER, f"{upload_id}.part")
+        with open(part_path, "r+b") as f:
+            f.seek(offset)
+            while True:
+                block = buffer.read(1 << 20)
+                if not block:
+                    break
+                f.write(block)
+    
+    upload_sessions_collection.update_one(
+        {"upload_id": upload_id},
+        {"$addToSet": {"received": chunk_index}}
+    )
+    
+    return jsonify({"upload_id": upload_id, "chunk": chunk_index, "received": True}), 200
+
+
+@video_processing_bp.route("/uploads/<upload_id>", methods=["GET"])
+@jwt_required()
+def get_upload_status(upload_id):
+    """
+    Endpoint to list the chunks still missing, so a client can resume an interrupted upload.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email') if isinstance(current_user, dict) else current_user
+    
+    session = get_upload_session(upload_id, user_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    
+    received = set(session["received"])
+    missing = [index for index in range(session["total_chunks"]) if index not in received]
+    
+    return jsonify({
+        "upload_id": upload_id,
+        "lecture_id": session["lecture_id"],
+        "status": session["status"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received_chunks": len(received),
+        "missing_chunks": missing
+    }), 200
+
+
+@video_processing_bp.route("/uploads/<upload_id>/finalize", methods=["POST"])
+@jwt_required()
+def finalize_chunked_upload(upload_id):
+    """
+    Endpoint to complete a chunked upload and queue the video for processing.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email') if isinstance(current_user, dict) else current_user
+    
+    session = get_upload_session(upload_id, user_id)
+    if not session:
+        return jsonify({"error": "Upload not found"}), 404
+    if session["status"] != "uploading":
+        return jsonify({"error": f"Upload is already {session['status']}"}), 409
+    
+    missing = session["total_chunks"] - len(set(session["received"]))
+    if missing:
+        return jsonify({"error": f"{missing} chunks are still missing"}), 409
+    
+    if not job_queue.has_capacity():
+        return jsonify({"error": "Processing queue is full. Please try again later."}), 503
+    
+    # Claim the session so a concurrent finalize cannot queue it twice
+    claimed = upload_sessions_collection.update_one(
+        {"upload_id": upload_id, "status": "uploading"},
+        {"$set": {"status": "finalizing"}}
     )
+    if not claimed.modified_count:
+        return jsonify({"error": "Upload is already being finalized"}), 409
     
-    # Process the video in a separate process to avoid blocking
-    process = multiprocessing.Process(
-        target=process_video_and_transcript,
-        args=(video_path, lecture_id, user_id, preferred_language)
+    lecture_id = session["lecture_id"]
+    part_path = os.path.join(UPLOAD_FOLDER, f"{upload_id}.part")
+    video_path = os.path.join(UPLOAD_FOLDER, f"{lecture_id}.mp4")
+    os.replace(part_path, video_path)
+    content_hash = artifact_cache.file_hash(video_path)
+    
+    try:
+        job_id = queue_video_processing(
+            video_path, lecture_id, user_id, session["preferred_language"], session["priority"], content_hash
+        )
+    except job_queue.QueueFullError as e:
+        # Keep the received file so finalize can simply be retried later
+        os.replace(video_path, part_path)
+        upload_sessions_collection.update_one({"upload_id": upload_id}, {"$set": {"status": "uploading"}})
+        return jsonify({"error": str(e)}), 503
+    
+    upload_sessions_collection.update_one(
+        {"upload_id": upload_id},
+        {"$set": {"status": "completed", "content_hash": content_hash, "job_id": job_id}}
     )
-    process.start()
     
     return jsonify({
-        "message": "Video upload successful. Processing started.",
+        "message": "Video upload successful. Processing queued.",
         "lecture_id": lecture_id,
-        "preferred_language": preferred_language
+        "preferred_language": session["preferred_language"],
+        "job_id": job_id
     }), 202
 
-def process_video_and_transcript(video_path, lecture_id, user_id, preferred_language="english"):
+def process_video_and_transcript(video_path, lecture_id, user_id, preferred_language="english", content_hash=None):
     """
     Process a video file to generate transcript and analyze content, optionally translating the transcript.
     """
     try:
-        # Update status to audio extraction
-        processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"stage": "extracting_audio", "progress": 10}},
-            upsert=True
-        )
+        if content_hash is None:
+            content_hash = artifact_cache.file_hash(video_path)
         
-        # Extract audio from video
-        audio_path = os.path.join(PROCESSED_FOLDER, f"{lecture_id}_audio.mp3")
-        extract_audio(video_path, audio_path)
+        status_key = {"lecture_id": lecture_id, "user_id": user_id}
         
-        # Update status to audio splitting
-        processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"stage": "splitting_audio", "progress": 20}},
-            upsert=True
-        )
+        def extract_audio(results):
+            # Stream 16 kHz mono PCM out of the video, reusing the cached audio of an identical upload
+            if artifact_cache.has_file(content_hash, "audio.pcm"):
+                print(f"Reusing cached audio for {video_path}")
+                return artifact_cache.artifact_path(content_hash, "audio.pcm")
+            tmp_path = artifact_cache.temp_path(content_hash, "audio.pcm")
+            extract_pcm(video_path, tmp_path)
+            return artifact_cache.commit_file(content_hash, "audio.pcm", tmp_path)
         
-        # Split audio into chunks for processing
-        chunk_paths = split_audio(audio_path, output_dir=os.path.join(PROCESSED_FOLDER, f"{lecture_id}_chunks"))
+        def split_audio(results):
+            # Split audio into chunks for processing
+            return segment_pcm(results["extracting_audio"])
         
-        # Update status to transcription
-        processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"stage": "transcribing", "progress": 30}},
-            upsert=True
-        )
+        def transcribe(results):
+            # Transcribe audio chunks with timestamps
+            return transcribe_audio_chunks_with_timestamps(
+                results["extracting_audio"], results["splitting_audio"], lecture_id, user_id
+            )
         
-        # Transcribe audio chunks with timestamps
-        transcripts = transcribe_audio_chunks_with_timestamps(chunk_paths)
+        def save_transcript(results):
+            return save_transcripts_with_timestamps(results["transcribing"], lecture_id, user_id)
         
-        # Update status to saving transcripts
-        processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"stage": "saving_transcripts", "progress": 60}},
-            upsert=True
-        )
-        
-        # Save transcripts to database
-        plain_transcript = save_transcripts_with_timestamps(transcripts, lecture_id, user_id)
+        def digest_transcript(results):
+            # Precompute the digest that notes and quiz generation reuse
+            try:
+                transcript_digest.compute_digest(
+                    lecture_id, user_id, results["transcribing"], results["saving_transcripts"]
+                )
+            except Exception as e:
+                # Generation falls back to building the digest on demand
+                print(f"Transcript digest failed: {str(e)}")
         
-        # Translate transcript if language is not English
-        if preferred_language.lower() != "english":
-            # Update status to translation
-            processing_status_collection.update_one(
-                {"lecture_id": lecture_id, "user_id": user_id},
-                {"$set": {"stage": f"translating_to_{preferred_language}", "progress": 65}},
-                upsert=True
+        def translate_transcript(results):
+            translated_text = translate_text(
+                results["saving_transcripts"],
+                preferred_language.capitalize(),
+                progress=translation_progress(lecture_id, user_id)
             )
             
-            # Translate transcript
-            translated_text = translate_text(plain_transcript, preferred_language.capitalize())
-            
             # Save translation to database
             translations_collection.insert_one({
                 "lecture_id": lecture_id,
@@ -723,26 +964,76 @@ def process_video_and_transcript(video_path, lecture_id, user_id, preferred_lang
                 "translated_text": translated_text
             })
         
-        # Update status to video processing
+        def index_frames(results):
+            # One decode pass for the keyframe table and thumbnails, alongside transcription
+            try:
+                return frame_index_store.build_index(video_path, content_hash)
+            except Exception as e:
+                # Video analysis falls back to probing the video itself
+                print(f"Frame indexing failed: {str(e)}")
+                return None
+        
+        def detect_questions(results):
+            return find_question_windows(lecture_id, user_id, content_hash)
+        
+        def analyze_video(results):
+            # Hand raise detection and question analysis
+            process_video(video_path, lecture_id, user_id, content_hash, results["detecting_questions"],
+                          results["indexing_frames"])
+        
+        # Each stage starts as soon as the stages it needs are done, so the Gemini-bound digest and
+        # translation overlap with frame decoding and hand raise detection
+        stages = [
+            Stage("extracting_audio", extract_audio, progress=10),
+            Stage("indexing_frames", index_frames, progress=10),
+            Stage("splitting_audio", split_audio, after=["extracting_audio"], progress=20),
+            Stage("transcribing", transcribe, after=["extracting_audio", "splitting_audio"], progress=30),
+            Stage("saving_transcripts", save_transcript, after=["transcribing"], progress=60),
+            Stage("digesting_transcript", digest_transcript, after=["transcribing", "saving_transcripts"], progress=62),
+            Stage("detecting_questions", detect_questions, after=["saving_transcripts"], progress=65),
+            Stage("analyzing_video", analyze_video, after=["detecting_questions", "indexing_frames"], progress=70),
+        ]
+        if preferred_language.lower() != "english":
+            stages.append(Stage(f"translating_to_{preferred_language}", translate_transcript,
+                                after=["saving_transcripts"], progress=65))
+        
+        def stage_started(stage):
+            processing_status_collection.update_one(
+                status_key,
+                {
+                    "$set": {"stage": stage.name, f"stage_timings.{stage.name}": {"started_at": time.time()}},
+                    "$addToSet": {"stages_running": stage.name},
+                    "$max": {"progress": stage.progress}
+                },
+                upsert=True
+            )
+        
+        def stage_finished(stage, timing):
+            processing_status_collection.update_one(
+                status_key,
+                {
+                    "$set": {f"stage_timings.{stage.name}": timing},
+                    "$pull": {"stages_running": stage.name}
+                }
+            )
+        
         processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"stage": "analyzing_video", "progress": 70}},
+            status_key,
+            {"$set": {"stage_timings": {}, "stages_running": []}},
             upsert=True
         )
-        
-        # Process video for hand raise detection and question analysis
-        process_video(video_path, lecture_id, user_id)
-        
-        # Clean up temporary files
-        os.remove(audio_path)
-        for chunk in chunk_paths:
-            if os.path.exists(chunk):
-                os.remove(chunk)
+        started_at = time.time()
+        run_stages(stages, on_start=stage_started, on_finish=stage_finished)
         
         # Update status to completed
         processing_status_collection.update_one(
-            {"lecture_id": lecture_id, "user_id": user_id},
-            {"$set": {"status": "completed", "stage": "completed", "progress": 100}},
+            status_key,
+            {"$set": {
+                "status": "completed",
+                "stage": "completed",
+                "progress": 100,
+                "pipeline_seconds": round(time.time() - started_at, 3)
+            }},
             upsert=True
         )
         
@@ -761,6 +1052,8 @@ def process_video_and_transcript(video_path, lecture_id, user_id, preferred_lang
             {"$set": {"error": str(e)}},
             upsert=True
         )
+        # Let the job queue record the job as failed
+        raise
 
 @video_processing_bp.route("/transcript/<lecture_id>", methods=["GET"])
 @jwt_required()
@@ -779,6 +1072,10 @@ def get_transcript(lecture_id):
     if language not in SUPPORTED_LANGUAGES:
         return jsonify({"error": f"Unsupported language. Supported options are: {', '.join(SUPPORTED_LANGUAGES)}"}), 400
     
+    # Stream segments as they are transcribed when the client asks for events
+    if request.args.get('stream') == 'events' or 'text/event-stream' in request.headers.get('Accept', ''):
+        return stream_transcript_events(lecture_id, user_id)
+    
     # Stream the transcript to client with specified language
     return stream_transcripts(lecture_id, user_id, language)
 
@@ -820,6 +1117,60 @@ def get_processing_status(lecture_id):
         
     return jsonify(status), 200
 
+@video_processing_bp.route("/thumbnails/<lecture_id>", methods=["GET"])
+@jwt_required()
+def get_thumbnail(lecture_id):
+    """
+    Serves the thumbnail nearest to ?t=<seconds> from the lecture's frame index as a JPEG,
+    or describes the index when no time is given. Nothing is decoded from the video.
+    """
+    current_user = get_jwt_identity()
+    user_id = current_user.get('userId') or current_user.get('email') if isinstance(current_user, dict) else current_user
+    
+    status = processing_status_collection.find_one(
+        {"lecture_id": lecture_id, "user_id": user_id},
+        {"content_hash": 1}
+    )
+    if not status or not status.get("content_hash"):
+        return jsonify({"error": "Lecture not found"}), 404
+    
+    index = frame_index_store.open_index(status["content_hash"])
+    if index is None:
+        return jsonify({"error": "Thumbnails are not available yet"}), 404
+    
+    seconds = request.args.get("t", type=float)
+    if seconds is None:
+        return jsonify(index.summary()), 200
+    
+    thumbnail = index.thumbnail_at(max(0.0, seconds))
+    if thumbnail is None:
+        return jsonify({"error": "Thumbnails are not available yet"}), 404
+    return Response(thumbnail, mimetype="image/jpeg", headers={"Cache-Control": "private, max-age=86400"})
+
+@video_processing_bp.route("/queue/metrics", methods=["GET"])
+@jwt_required()
+def get_queue_metrics():
+    """
+    Endpoint to report processing queue depth, wait times and worker health.
+    """
+    return jsonify(job_queue.queue_metrics()), 200
+
+@video_processing_bp.route("/translation/metrics", methods=["GET"])
+@jwt_required()
+def get_translation_metrics():
+    """
+    Endpoint to report translation memory lookups and hit rate for this process.
+    """
+    return jsonify(translation.memory.metrics()), 200
+
+@video_processing_bp.route("/llm/metrics", methods=["GET"])
+@jwt_required()
+def get_llm_metrics():
+    """
+    Endpoint to report Gemini call latency, token usage and rate limiting for this process.
+    """
+    return jsonify(llm.metrics()), 200
+
 @video_processing_bp.route("/update-dashboard", methods=["POST"])
 @jwt_required()
 def update_dashboard():
@@ -955,24 +1306,36 @@ def translate_transcript():
     
     original_text = transcript_record.get("plain_transcript", "")
     
-    # Start translation in a separate process
-    process = multiprocessing.Process(
-        target=process_translation,
-        args=(original_text, lecture_id, user_id, target_language)
-    )
-    process.start()
+    # Translation is Gemini-bound, so it runs on the generation job threads rather than in a new
+    # process; repeated requests for the same translation share one job
+    try:
+        job_id = generation_jobs.submit(
+            "translation", user_id, process_translation,
+            original_text, lecture_id, user_id, target_language,
+            key=generation_jobs.request_key("translation", user_id, lecture_id, target_language)
+        )
+    except generation_jobs.TooManyJobsError as e:
+        return jsonify({"error": str(e)}), 429
     
     return jsonify({
         "message": f"Translation to {target_language} initiated",
         "lecture_id": lecture_id,
         "language": target_language,
-        "status": "processing"
+        "status": "processing",
+        "job_id": job_id
     }), 202
 
-def process_translation(text, lecture_id, user_id, target_language):
+def process_translation(text, lecture_id, user_id, target_language, report=None):
     """
-    Process translation of text in a separate process.
+    Background job body for /translate; progress goes to the processing status and the job.
     """
+    record_progress = translation_progress(lecture_id, user_id)
+    
+    def progress(done, total):
+        record_progress(done, total)
+        if report:
+            report("translating", int(100 * done / total))
+    
     try:
         # Update processing status
         processing_status_collection.update_one(
@@ -986,7 +1349,11 @@ def process_translation(text, lecture_id, user_id, target_language):
         )
         
         # Translate the text
-        translated_text = translate_text(text, target_language.capitalize())
+        translated_text = translate_text(
+            text,
+            target_language.capitalize(),
+            progress=progress
+        )
         
         # Save translation
         translations_collection.insert_one({
@@ -1017,6 +1384,8 @@ def process_translation(text, lecture_id, user_id, target_language):
                 "translation_error": str(e)
             }}
         )
+        # Let the generation job record the failure
+        raise
 
 @video_processing_bp.route("/translation-status/<lecture_id>", methods=["GET"])
 @jwt_required()
@@ -0,0 +1,329 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+import llm
+
+load_dotenv()
+
+
+# Chunks in flight per process; llm applies the Gemini rate limit on top
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", 4))
+TRANSLATION_CHUNK_CHARS = int(os.getenv("TRANSLATION_CHUNK_CHARS", 6000))
+TRANSLATION_MEMORY_SIZE = int(os.getenv("TRANSLATION_MEMORY_SIZE", 20000))
+
+PARAGRAPH_BREAK = re.compile(r"(\n\s*\n)")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?।])(\s+)")
+SEGMENT_MARKER = re.compile(r"^[ \t]*<<<(\d+)>>>[ \t]*$", re.MULTILINE)
+INLINE_SPACE = re.compile(r"[ \t]+")
+
+mongo_uri = os.getenv("MONGO_URI")
+mongo_client = MongoClient(mongo_uri)
+db = mongo_client.get_default_database()
+translation_memory_collection = db.translation_memory
+
+
+class TranslationMemory:
+    """
+    Segment translations keyed by a hash of the normalized source and target language.
+
+    Lookups go to an in-process LRU first and then to Mongo, so every worker shares the same memory.
+    """
+
+    def __init__(self, collection, size=TRANSLATION_MEMORY_SIZE):
+        self.collection = collection
+        self.size = size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "lru_hits": 0, "mongo_hits": 0, "misses": 0, "stored": 0}
+
+    @staticmethod
+    def normalize(segment):
+        """
+        Normalizes a segment so whitespace-only edits still hit the memory.
+        """
+        segment = unicodedata.normalize("NFC", segment)
+        return "\n".join(INLINE_SPACE.sub(" ", line).strip() for line in segment.strip().splitlines())
+
+    @classmethod
+    def key(cls, segment, target_language):
+        """
+        Returns the memory key of a source segment for a target language.
+        """
+        source = f"{target_language.lower()}\n{cls.normalize(segment)}"
+        return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, translated):
+        self._cache[key] = translated
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def get_many(self, keys):
+        """
+        Looks up keys and returns a dict of the translations found.
+        """
+        found = {}
+        with self._lock:
+            self.stats["lookups"] += len(keys)
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+            self.stats["lru_hits"] += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing:
+            try:
+                for doc in self.collection.find({"_id": {"$in": missing}}, {"translation": 1}):
+                    found[doc["_id"]] = doc["translation"]
+            except Exception as e:
+                print(f"Translation memory lookup failed: {str(e)}")
+
+        with self._lock:
+            self.stats["mongo_hits"] += len(found) - (len(keys) - len(missing))
+            self.stats["misses"] += len(keys) - len(found)
+            for key in missing:
+                if key in found:
+                    self._remember(key, found[key])
+        return found
+
+    def put_many(self, entries, target_language):
+        """
+        Stores translations given as {key: (source, translated)}.
+        """
+        if not entries:
+            return
+        with self._lock:
+            for key, (_, translated) in entries.items():
+                self._remember(key, translated)
+            self.stats["stored"] += len(entries)
+
+        now = time.time()
+        try:
+            self.collection.bulk_write([
+                UpdateOne(
+                    {"_id": key},
+                    {"$set": {
+                        "language": target_language.lower(),
+                        "source": self.normalize(source),
+                        "translation": translated,
+                        "updated_at": now
+                    }},
+                    upsert=True
+                )
+                for key, (source, translated) in entries.items()
+            ], ordered=False)
+        except Exception as e:
+            print(f"Translation memory write failed: {str(e)}")
+
+    def metrics(self):
+        """
+        Reports lookups and the hit rate since the process started.
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        hits = stats["lru_hits"] + stats["mongo_hits"]
+        stats["hit_rate"] = round(hits / stats["lookups"], 3) if stats["lookups"] else 0
+        stats["lru_entries"] = len(self._cache)
+        return stats
+
+
+_executor = ThreadPoolExecutor(max_workers=TRANSLATION_CONCURRENCY, thread_name_prefix="translation")
+memory = TranslationMemory(translation_memory_collection)
+
+
+def _pairs(parts):
+    """
+    Turns re.split output with one capture group into (body, separator) pairs.
+    """
+    parts = parts + [""] if len(parts) % 2 else parts
+    return [(parts[i], parts[i + 1]) for i in range(0, len(parts), 2)]
+
+
+def _blocks(text, markdown):
+    """
+    Splits text into paragraphs, keeping fenced markdown code blocks whole.
+    """
+    blocks = []
+    open_fence = False
+    for body, separator in _pairs(PARAGRAPH_BREAK.split(text)):
+        if open_fence:
+            previous_body, previous_separator = blocks[-1]
+            blocks[-1] = (previous_body + previous_separator + body, separator)
+        else:
+            blocks.append((body, separator))
+        if markdown and body.count("```") % 2:
+            open_fence = not open_fence
+    return blocks
+
+
+def split_units(text, max_chars=TRANSLATION_CHUNK_CHARS, markdown=False):
+    """
+    Splits text into paragraphs, breaking paragraphs longer than max_chars into sentences.
+
+    Returns:
+        list: (segment, separator) pairs; joining segment + separator restores the text
+    """
+    units = []
+    for body, separator in _blocks(text, markdown):
+        if len(body) <= max_chars or body.lstrip().startswith("```"):
+            units.append((body, separator))
+            continue
+        sentences = _pairs(SENTENCE_BREAK.split(body))
+        for index, (sentence, sentence_separator) in enumerate(sentences):
+            last = index == len(sentences) - 1
+            # Hard-slice sentences that are longer than a chunk on their own
+            for start in range(0, max(1, len(sentence)), max_chars):
+                piece = sentence[start:start + max_chars]
+                end = start + max_chars >= len(sentence)
+                units.append((piece, (separator if last else sentence_separator) if end else ""))
+    return units
+
+
+def pack_units(units, max_chars=TRANSLATION_CHUNK_CHARS):
+    """
+    Joins consecutive (segment, separator) pairs into chunks of at most max_chars.
+    """
+    chunks = []
+    current, current_separator = None, ""
+    for body, separator in units:
+        if current is not None and len(current) + len(current_separator) + len(body) > max_chars:
+            chunks.append((current, current_separator))
+            current = None
+        current = body if current is None else current + current_separator + body
+        current_separator = separator
+    if current is not None:
+        chunks.append((current, current_separator))
+    return chunks
+
+
+def split_text(text, max_chars=TRANSLATION_CHUNK_CHARS, markdown=False):
+    """
+    Packs paragraphs (or sentences of oversized paragraphs) into chunks of at most max_chars.
+
+    Args:
+        text (str): Text to split
+        max_chars (int): Target maximum chunk length
+        markdown (bool): Keep fenced code blocks in one chunk
+
+    Returns:
+        list: (chunk, separator) pairs; joining chunk + separator restores the text
+    """
+    return pack_units(split_units(text, max_chars, markdown), max_chars)
+
+
+def _mark_segments(segments):
+    """
+    Joins segments into one request, each preceded by a <<<n>>> marker line.
+    """
+    return "\n\n".join(f"<<<{index}>>>\n{segment}" for index, segment in enumerate(segments))
+
+
+def _unmark_segments(text, count):
+    """
+    Splits a marked response back into segments, or returns None if markers were lost.
+    """
+    parts = SEGMENT_MARKER.split(text)
+    segments = {}
+    for i in range(1, len(parts) - 1, 2):
+        segments[int(parts[i])] = parts[i + 1].strip()
+    if sorted(segments) != list(range(count)):
+        return None
+    return [segments[index] for index in range(count)]
+
+
+def translate(text, target_language, instructions="", markdown=False, progress=None,
+              max_chars=TRANSLATION_CHUNK_CHARS, generation_config=None):
+    """
+    Translates text with a Gemini model, reusing stored segment translations.
+
+    Text is split on paragraph and sentence boundaries and each segment is looked up in the
+    translation memory. Only misses are sent to Gemini, packed into marked batches.
+
+    Args:
+        text (str): Text to translate
+        target_language (str): Target language name (e.g., 'Hindi', 'Telugu')
+        instructions (str): Extra prompt lines, e.g. formatting to preserve
+        markdown (bool): Treat the text as markdown when splitting
+        progress (callable): Optional progress(done, total) callback
+        generation_config (dict): Optional Gemini generation settings
+
+    Returns:
+        str: Translated text in the original order
+    """
+    units = split_units(text, max_chars, markdown)
+    keys = [TranslationMemory.key(body, target_language) if body.strip() else None for body, _ in units]
+    found = memory.get_many(list({key for key in keys if key}))
+
+    # Each distinct missing segment is translated once, however often it repeats
+    missing = {}
+    for key, (body, _) in zip(keys, units):
+        if key and key not in found and key not in missing:
+            missing[key] = body.strip()
+    batches, size = [], 0
+    for key in missing:
+        if not batches or size + len(missing[key]) > max_chars:
+            batches.append([])
+            size = 0
+        batches[-1].append(key)
+        size += len(missing[key]) + 2
+    print(f"Translating {len(text)} characters to {target_language}: "
+          f"{len(set(keys) - {None}) - len(missing)} segments from memory, "
+          f"{len(missing)} in {len(batches)} requests...")
+
+    def generate(chunk, marked):
+        marker_note = "Keep every <<<n>>> marker line exactly as it is." if marked else ""
+        prompt = f"""Translate the following text to {target_language}.
+        {instructions}
+        {marker_note}
+        Return only the translated text without any explanations or additional content.
+
+        TEXT TO TRANSLATE:
+        {chunk}
+        """
+        response = llm.generate(prompt, generation_config=generation_config)
+        return response.text
+
+    def run(segments):
+        if len(segments) == 1:
+            return [generate(segments[0], False).strip()]
+        translated = _unmark_segments(generate(_mark_segments(segments), True), len(segments))
+        if translated is None:
+            # The model merged or dropped markers; fall back to one request per segment
+            translated = []
+            for segment in segments:
+                translated.append(generate(segment, False).strip())
+        return translated
+
+    futures = {}
+    for batch_keys in batches:
+        futures[_executor.submit(run, [missing[key] for key in batch_keys])] = batch_keys
+
+    done = 0
+    for future in as_completed(futures):
+        batch_keys = futures[future]
+        translated = future.result()
+        found.update(zip(batch_keys, translated))
+        memory.put_many({key: (missing[key], value) for key, value in zip(batch_keys, translated)},
+                        target_language)
+        done += 1
+        if progress:
+            progress(done, len(futures))
+
+    result = []
+    for key, (body, separator) in zip(keys, units):
+        if key is None:
+            result.append(body + separator)
+            continue
+        # Models drop surrounding whitespace, so put the original padding back
+        leading = body[:len(body) - len(body.lstrip())]
+        trailing = body[len(body.rstrip()):]
+        result.append(leading + found[key] + trailing + separator)
+    return "".join(result)
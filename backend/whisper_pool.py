@@ -0,0 +1,132 @@
+import os
+import time
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# Whisper model size and number of resident transcription workers
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Per-process state, populated by the pool initializer in each worker
+_model = None
+_model_name = None
+_load_seconds = None
+
+# Pool shared by every lecture processed in this process
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker(model_name):
+    """
+    Loads the Whisper model once when a pool worker starts.
+    """
+    global _model, _model_name, _load_seconds
+    import torch
+    import whisper
+
+    started = time.perf_counter()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    _model = whisper.load_model(model_name).to(device)
+    _model_name = model_name
+    _load_seconds = time.perf_counter() - started
+    print(f"[whisper pool] pid {os.getpid()} loaded '{model_name}' on {device} in {_load_seconds:.2f}s")
+
+
+def _transcribe(pcm_path, start_sample, end_sample):
+    """
+    Transcribes a slice of a PCM file with the worker's resident model and reports timings.
+    """
+    from audio_stream import load_pcm_slice
+
+    started = time.perf_counter()
+    audio = load_pcm_slice(pcm_path, start_sample, end_sample)
+    result = _model.transcribe(audio)
+    latency = time.perf_counter() - started
+    print(f"[whisper pool] pid {os.getpid()} transcribed samples {start_sample}-{end_sample} in {latency:.2f}s")
+    return {
+        "segments": result["segments"],
+        "latency": latency,
+        "load_seconds": _load_seconds,
+        "model": _model_name,
+        "pid": os.getpid(),
+    }
+
+
+def get_pool(model_name=WHISPER_MODEL, max_workers=WHISPER_WORKERS):
+    """
+    Returns the process-wide Whisper pool, creating it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            print(f"[whisper pool] starting {max_workers} workers with model '{model_name}'")
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_worker,
+                initargs=(model_name,),
+            )
+        return _pool
+
+
+def _discard(pool):
+    """
+    Drops a broken pool so the next get_pool() starts a fresh one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def submit(pcm_path, start_sample, end_sample, retries=1):
+    """
+    Queues a slice of a PCM file for transcription on the resident pool.
+
+    If a worker dies (e.g. OOM-killed), the pool is broken for every later call; it is then
+    replaced and the slice resubmitted, up to `retries` times.
+    """
+    result = Future()
+
+    def attempt(remaining):
+        pool = get_pool()
+        try:
+            future = pool.submit(_transcribe, pcm_path, start_sample, end_sample)
+        except BrokenProcessPool as e:
+            retry(pool, remaining, e)
+            return
+
+        def done(future):
+            try:
+                result.set_result(future.result())
+            except BrokenProcessPool as e:
+                retry(pool, remaining, e)
+            except Exception as e:
+                result.set_exception(e)
+
+        future.add_done_callback(done)
+
+    def retry(pool, remaining, error):
+        _discard(pool)
+        if remaining <= 0:
+            result.set_exception(error)
+            return
+        print(f"[whisper pool] pool broke ({str(error)}), retrying samples {start_sample}-{end_sample} on a new pool")
+        attempt(remaining - 1)
+
+    attempt(retries)
+    return result
+
+
+def shutdown(wait=True):
+    """
+    Stops the pool workers and releases their models.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=wait)
+            _pool = None